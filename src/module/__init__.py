@@ -26,7 +26,7 @@ along with Luna.  If not, see <http://www.gnu.org/licenses/>.
 
 from luna.config import *
 import pymongo
-from cluster import Cluster
+from cluster import Cluster, DhcpHostsUpdater
 from osimage import OsImage
 from bmcsetup import BMCSetup
 from node import Node, Group
@@ -35,21 +35,12 @@ from network import Network
 from tracker import *
 from manager import Manager
 from utils import *
+from schema import ensure_indexes, check_indexes
 from otherdev import OtherDev
 
-def list(collection):
-    import logging
-    logging.basicConfig(level=logging.INFO)
-#    logging.basicConfig(level=logging.DEBUG)
-    logger = logging.getLogger(__name__)
-
-    try:
-        mongo_client = pymongo.MongoClient(get_con_options())
-    except:
-        logger.error("Unable to connect to MongoDB.")
-        raise RuntimeError
-    logger.debug("Connection to MongoDB was successful.")
-    mongo_db = mongo_client[db_name]
+def list(collection, mongo_db = None):
+    if not mongo_db:
+        mongo_db = get_mongo_db()
     mongo_collection = mongo_db[collection]
     ret = []
     for doc in mongo_collection.find({}):
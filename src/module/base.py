@@ -25,6 +25,7 @@ import pymongo
 import logging
 import inspect
 import json
+import copy
 from bson.objectid import ObjectId
 from bson.dbref import DBRef
 from utils import *
@@ -61,17 +62,12 @@ class Base(object):
         if mongo_db:
             self._mongo_db = mongo_db
         else:
-            try:
-                self._mongo_client = pymongo.MongoClient(get_con_options())
-            except:
-                self._logger.error("Unable to connect to MongoDB.")
-                raise RuntimeError
-            self._logger.debug("Connection to MongoDB was successful.")
-            self._mongo_db = self._mongo_client[db_name]
+            self._mongo_db = get_mongo_db()
         self._mongo_collection = self._mongo_db[self._collection_name]
         if id:
             mongo_doc = self._mongo_collection.find_one({'_id': id})
             if mongo_doc:
+                self._json = mongo_doc
                 return mongo_doc
         if not name:
             self._logger.error("'name' needs to be specified")
@@ -83,6 +79,7 @@ class Base(object):
         if create and mongo_doc and mongo_doc['name'] == name:
             self._logger.error("'{}' is already created".format(name))
             raise RuntimeError
+        self._json = mongo_doc
         return mongo_doc
 
     def _debug_function(self):
@@ -114,19 +111,40 @@ class Base(object):
             self.__dict__.pop(key, None)
         return None
 
-    def _get_json(self):
+    def _get_json(self, fresh = False):
+        """
+        Returns copy of the document. Document is fetched from MongoDB
+        once and is kept until object changes it or refresh() is called.
+        fresh=True forces re-reading from MongoDB
+        """
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
+        if fresh or self._json is None:
+            self._json = self._mongo_collection.find_one({'_id': self._id})
+        return copy.deepcopy(self._json)
+
+    def _config_changed(self):
+        """
+        Is called after changing the object to invalidate caches
+        of other processes
+        """
+        bump_generation('config', self._mongo_db)
         if self._id:
-            return self._mongo_collection.find_one({'_id': self._id})
+            bump_generation(object_generation(self._collection_name, self._id), self._mongo_db)
+
+    def refresh(self):
+        """
+        Drop cached document, so it will be re-read from MongoDB on next access
+        """
+        self._json = None
 
     def __repr__(self):
         """
         Returns nice JSON
         """
         from bson.json_util import dumps
-        return dumps(self._get_json(), sort_keys=True, indent=4, separators=(',', ': '))
+        return dumps(self._get_json(fresh = True), sort_keys=True, indent=4, separators=(',', ': '))
 
     def __str__(self):
         """
@@ -134,19 +152,47 @@ class Base(object):
         """
         return self._name
 
-    def show(self):
+    def _resolve_dbrefs(self, dbrefs, resolved = None):
+        """
+        Fetch names for the list of DBRefs using one query per collection.
+        'resolved' is an identity map {(collection, id): name} which can be
+        shared between calls to avoid loading the same document twice.
+        Missing documents are mapped to None
+        """
+        if resolved is None:
+            resolved = {}
+        ids = {}
+        for dbref in dbrefs:
+            if (dbref.collection, dbref.id) in resolved:
+                continue
+            ids.setdefault(dbref.collection, set()).add(dbref.id)
+        for collection in ids:
+            cursor = self._mongo_db[collection].find({'_id': {'$in': list(ids[collection])}}, {'name': 1})
+            for doc in cursor:
+                resolved[(collection, doc['_id'])] = doc.get('name')
+            for uid in ids[collection]:
+                resolved.setdefault((collection, uid), None)
+        return resolved
+
+    def show(self, resolved = None):
+        def collect_dbrefs(json, dbrefs):
+            if type(json) is DBRef:
+                dbrefs.append(json)
+            elif type(json) is dict:
+                for key in json:
+                    collect_dbrefs(json[key], dbrefs)
+            elif type(json) is list:
+                for elem in json:
+                    collect_dbrefs(elem, dbrefs)
+            return dbrefs
+
         def get_value(value):
             if type(value) is not DBRef:
                 return value
-            dbref = value
-            #mongo_db = self._mongo_client[db_name]
-            mongo_db = self._mongo_db
-            mongo_collection = self._mongo_db[dbref.collection]
-            try:
-                name = '[' + mongo_collection.find_one({'_id': dbref.id})['name'] + ']'
-            except:
-                name = '[id_' + str(dbref.id) + ']'
-            return name
+            name = resolved.get((value.collection, value.id))
+            if name is None:
+                return '[id_' + str(value.id) + ']'
+            return '[' + name + ']'
 
         def resolve_links(json):
             internal_json = {}
@@ -179,6 +225,7 @@ class Base(object):
             json.pop(usedby_key)
         except:
             pass
+        resolved = self._resolve_dbrefs(collect_dbrefs(json, []), resolved)
         return resolve_links(json)
 
     @property
@@ -206,8 +253,9 @@ class Base(object):
     def json(self):
         """
         Raw json from MongoDB. One should not use it for change
+        Always re-read from MongoDB
         """
-        return self._get_json()
+        return self._get_json(fresh = True)
 
     @property
     def nice_json(self):
@@ -215,7 +263,7 @@ class Base(object):
         Raw json from MongoDB. One should not use it for change
         """
         from bson.json_util import dumps
-        return dumps(self._get_json(), sort_keys=True, indent=4, separators=(',', ': '))
+        return dumps(self._get_json(fresh = True), sort_keys=True, indent=4, separators=(',', ': '))
 
     @property
     def keylist(self):
@@ -276,6 +324,8 @@ class Base(object):
             value = unicode(value, "utf-8")
         mongo_doc = {key: value}
         self._mongo_collection.update({'_id': self._id}, {'$set': mongo_doc}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return True
 
     def rename(self, name):
@@ -291,6 +341,8 @@ class Base(object):
             self._logger.error("Object '{}' exists already".format(name))
             return None
         self._mongo_collection.update({'_id': self._id}, {'$set': {'name': name}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         self._name = name
         return True
 
@@ -315,39 +367,13 @@ class Base(object):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        remote_mongo_collection = self._mongo_db[remote_dbref.collection]
-        use_doc = self._mongo_collection.find_one({'_id': self._id},{use_key: 1, '_id':0})
-        usedby_doc = remote_mongo_collection.find_one({'_id': remote_dbref.id},{usedby_key: 1, '_id':0})
-        try:
-            use_doc = use_doc[use_key]
-        except:
-            use_doc = {}
+        mongo_collection = self._mongo_db[links_collection]
+        link = {'src': self._DBRef, 'dst': remote_dbref}
         try:
-            usedby_doc = usedby_doc[usedby_key]
-        except:
-            usedby_doc = {}
-        try:
-            link_count = use_doc[remote_dbref.collection][str(remote_dbref.id)]
-        except:
-            link_count = 0
-        try:
-            back_link_count = usedby_doc[self._DBRef.collection][str(self._DBRef.id)]
-        except:
-            back_link_count = 0
-        link_count += 1
-        back_link_count += 1
-        try:
-            use_doc[remote_dbref.collection][str(remote_dbref.id)] = link_count
-        except:
-            use_doc[remote_dbref.collection] = {}
-            use_doc[remote_dbref.collection][str(remote_dbref.id)] = link_count
-        try:
-            usedby_doc[self._DBRef.collection][str(self._DBRef.id)] = back_link_count
-        except:
-            usedby_doc[self._DBRef.collection] = {}
-            usedby_doc[self._DBRef.collection][str(self._DBRef.id)] = back_link_count
-        self._mongo_collection.update({'_id': self._id}, {'$set': {use_key: use_doc} })
-        remote_mongo_collection.update({'_id': remote_dbref.id},  {'$set': {usedby_key: usedby_doc} })
+            mongo_collection.update(link, {'$inc': {'count': 1}}, upsert = True)
+        except pymongo.errors.DuplicateKeyError:
+            # concurrent upsert created the document already
+            mongo_collection.update(link, {'$inc': {'count': 1}})
 
     def unlink(self, remote_dbref):
         """
@@ -371,47 +397,37 @@ class Base(object):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        remote_mongo_collection = self._mongo_db[remote_dbref.collection]
-        use_doc = self._mongo_collection.find_one({'_id': self._id},{use_key: 1, '_id':0})
-        usedby_doc = remote_mongo_collection.find_one({'_id': remote_dbref.id},{usedby_key: 1, '_id':0})
-        try:
-            use_doc = use_doc[use_key]
-        except:
-            use_doc = {}
-        try:
-            usedby_doc = usedby_doc[usedby_key]
-        except:
-            usedby_doc = {}
-        try:
-            link_count = use_doc[remote_dbref.collection][str(remote_dbref.id)]
-        except:
-            link_count = 0
-        try:
-            back_link_count = usedby_doc[self._DBRef.collection][str(self._DBRef.id)]
-        except:
-            back_link_count = 0
-        if link_count < 1:
-            self._logger.error("No links to this object. Cannot unlink.")
-            return None
-        if back_link_count < 1:
-            self._logger.error("Link to this objct exists, but no backlinks to this object. Cannot unlink.")
-            return None
-        link_count -= 1
-        back_link_count -= 1
-        if link_count < 1:
-            use_doc[remote_dbref.collection].pop(str(remote_dbref.id))
-            if len(use_doc[remote_dbref.collection]) < 1:
-                use_doc.pop(remote_dbref.collection)
-        else:
-            use_doc[remote_dbref.collection][str(remote_dbref.id)] = link_count
-        if back_link_count < 1:
-            usedby_doc[self._DBRef.collection].pop(str(self._DBRef.id))
-            if len(usedby_doc[self._DBRef.collection]) < 1:
-                usedby_doc.pop(self._DBRef.collection)
-        else:
-            usedby_doc[self._DBRef.collection][str(self._DBRef.id)] = back_link_count
-        self._mongo_collection.update({'_id': self._id}, {'$set': {use_key: use_doc } })
-        remote_mongo_collection.update({'_id': remote_dbref.id},  {'$set': {usedby_key: usedby_doc} })
+        mongo_collection = self._mongo_db[links_collection]
+        link = {'src': self._DBRef, 'dst': remote_dbref}
+        while True:
+            query = dict(link, count = {'$gt': 1})
+            res = mongo_collection.update(query, {'$inc': {'count': -1}})
+            if res['n']:
+                return True
+            query = dict(link, count = {'$lte': 1})
+            res = mongo_collection.remove(query)
+            if res['n']:
+                return True
+            # counter could be changed by somebody else between the queries
+            if not mongo_collection.find_one(link, {'_id': 1}):
+                self._logger.error("No links to this object. Cannot unlink.")
+                return None
+
+    def _format_links(self, dbrefs, resolve = False, resolved = None):
+        """
+        Build output of get_links/get_back_links, names are fetched in batch
+        """
+        if resolve:
+            resolved = self._resolve_dbrefs(dbrefs, resolved)
+        output = []
+        for dbref in dbrefs:
+            name = None
+            if resolve:
+                name = resolved.get((dbref.collection, dbref.id))
+            if name is None:
+                name = str(dbref.id)
+            output.extend([{'collection': dbref.collection, 'name': name, 'DBRef': dbref}])
+        return output
 
     def get_links(self, resolve=False, collection = None):
         """
@@ -421,32 +437,12 @@ class Base(object):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        use_doc = self._mongo_collection.find_one({'_id': self._id},{use_key: 1, '_id':0})
-        try:
-            use_doc = use_doc[use_key]
-        except:
-            return []
+        query = {'src': self._DBRef}
         if bool(collection):
-            try:
-                collection_objs = use_doc.pop('collection')
-            except:
-                collection_objs = {}
-            use_doc = {}
-            use_doc['collection'] = collection_objs
-        output = []
-        for col_iter in use_doc:
-            for uid in use_doc[col_iter]:
-                dbref = DBRef(col_iter, ObjectId(uid))
-                remote_mongo_collection = self._mongo_db[dbref.collection]
-                if not resolve:
-                    name = str(dbref.id)
-                else:
-                    try:
-                        name = remote_mongo_collection.find_one({'_id': dbref.id})['name']
-                    except:
-                        name = str(dbref.id)
-                output.extend([{'collection': dbref.collection, 'name': name, 'DBRef': dbref}])
-        return output
+            query['dst.$ref'] = collection
+        mongo_collection = self._mongo_db[links_collection]
+        dbrefs = [doc['dst'] for doc in mongo_collection.find(query, {'dst': 1, '_id': 0})]
+        return self._format_links(dbrefs, resolve)
 
     def get_back_links(self, resolve=False, collection = None):
         """
@@ -456,32 +452,12 @@ class Base(object):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        usedby_doc = self._mongo_collection.find_one({'_id': self._id},{usedby_key: 1, '_id':0})
-        try:
-            usedby_doc = usedby_doc[usedby_key]
-        except:
-            return []
+        query = {'dst': self._DBRef}
         if bool(collection):
-            try:
-                collection_objs = usedby_doc.pop('collection')
-            except:
-                collection_objs = {}
-            usedby_doc = {}
-            usedby_doc['collection'] = collection_objs
-        output = []
-        for col_iter in usedby_doc:
-            for uid in usedby_doc[col_iter]:
-                dbref = DBRef(col_iter, ObjectId(uid))
-                remote_mongo_collection = self._mongo_db[dbref.collection]
-                if not resolve:
-                    name = str(dbref.id)
-                else:
-                    try:
-                        name = remote_mongo_collection.find_one({'_id': dbref.id})['name']
-                    except:
-                        name = str(dbref.id)
-                output.extend([{'collection': dbref.collection, 'name': name, 'DBRef': dbref}])
-        return output
+            query['src.$ref'] = collection
+        mongo_collection = self._mongo_db[links_collection]
+        dbrefs = [doc['src'] for doc in mongo_collection.find(query, {'src': 1, '_id': 0})]
+        return self._format_links(dbrefs, resolve)
 
     def delete(self):
         """
@@ -491,9 +467,10 @@ class Base(object):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        links = self.get_links(resolve=True)
-        back_links = self.get_back_links(resolve=True)
+        links = self.get_links()
+        back_links = self.get_back_links()
         if len(back_links) > 0:
+            back_links = self._format_links([elem['DBRef'] for elem in back_links], resolve=True)
             self._logger.error("Current object is being written as a dependency for the following objects:")
             for elem in back_links:
                 try:
@@ -508,5 +485,6 @@ class Base(object):
         for link in links:
             self.unlink(link['DBRef'])
         ret = self._mongo_collection.remove({'_id': self._id}, multi=False)
+        self._config_changed()
         self._wipe_vars()
         return not ret['err']
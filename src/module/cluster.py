@@ -28,8 +28,163 @@ import subprocess
 import pwd
 import grp
 import errno
+import re
+import datetime
+import time
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+import fcntl
 from bson.dbref import DBRef
 from luna.base import Base
+from luna.schema import ensure_indexes
+from luna.utils import get_generation
+
+def _read_file(path):
+    """
+    Returns content of the file or None if it does not exist
+    """
+    try:
+        with open(path) as f:
+            return f.read()
+    except IOError:
+        return None
+
+# compiled templates shared between calls, {path: tornado.template.Loader}
+_template_loaders = {}
+_template_loaders_lock = threading.Lock()
+# render zones in parallel only if there are more zones than this
+_parallel_zones_threshold = 8
+
+def _get_template(path, name):
+    """
+    Returns compiled template from the module-wide cache
+    """
+    from tornado import template
+    with _template_loaders_lock:
+        tloader = _template_loaders.get(path)
+        if tloader is None:
+            tloader = template.Loader(path)
+            _template_loaders[path] = tloader
+        return tloader.load(name)
+
+def _write_file(path, content, uid = None, gid = None, mode = 0644):
+    """
+    Writes file atomically: content goes to the temporary file
+    in the same directory which is renamed afterwards
+    """
+    dirname, basename = os.path.split(os.path.abspath(path))
+    fd, tmppath = tempfile.mkstemp(prefix = '.' + basename + '.', dir = dirname)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmppath, mode)
+        if uid is not None or gid is not None:
+            os.chown(tmppath, -1 if uid is None else uid, -1 if gid is None else gid)
+        os.rename(tmppath, path)
+    except:
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+        raise
+
+def _render_zone(args):
+    """
+    Renders zone file. Returns (content, serial) or (None, serial)
+    if zone content is the same as on disk.
+    Module-level to be usable by multiprocessing.Pool
+    """
+    templ_path, templ, zonefilepath, z, min_serial = args
+    old_content = _read_file(zonefilepath)
+    old_serial = _get_zone_serial(old_content)
+    # render with the old serial to compare with existing file
+    z['serial_num'] = old_serial
+    content = _get_template(templ_path, templ).generate(z = z)
+    if old_content is not None and hashlib.md5(content).hexdigest() == hashlib.md5(old_content).hexdigest():
+        return (None, old_serial)
+    z['serial_num'] = max(old_serial + 1, min_serial)
+    return (_get_template(templ_path, templ).generate(z = z), z['serial_num'])
+
+_dhcp_host_re = re.compile(r'^host (\S+) \{\n.*?^\}\n', re.M | re.S)
+
+_omapi_port = 7911
+_omapi_timeout = 5
+
+def _parse_dhcp_hosts(content):
+    """
+    Returns {name: 'host name {...}'} for host entries in dhcpd config
+    """
+    if not content:
+        return {}
+    return dict((m.group(1), m.group(0)) for m in _dhcp_host_re.finditer(content))
+
+def _split_dhcp_host(entry):
+    """
+    Returns (mac, ip, statements) of host entry in dhcpd config
+    """
+    mac, ip, statements = None, None, []
+    for line in entry.split('\n')[1:]:
+        stripped = line.strip()
+        if stripped.startswith('hardware ethernet '):
+            mac = stripped[len('hardware ethernet '):].rstrip(';')
+        elif stripped.startswith('fixed-address '):
+            ip = stripped[len('fixed-address '):].rstrip(';')
+        else:
+            statements.append(line)
+    # drop closing brace of the entry
+    statements = '\n'.join(statements).strip()[:-1].strip()
+    return (mac, ip, statements)
+
+def _omapi_del_host(omapi, name):
+    """
+    Deletes host object from running dhcpd. Returns False if there is no such host
+    """
+    from pypureomapi import OmapiMessage, OmapiError, OMAPI_OP_UPDATE, OMAPI_OP_STATUS
+    msg = OmapiMessage.open('host')
+    msg.obj.append(('name', name))
+    response = omapi.query_server(msg)
+    if response.opcode != OMAPI_OP_UPDATE:
+        return False
+    response = omapi.query_server(OmapiMessage.delete(response.handle))
+    if response.opcode != OMAPI_OP_STATUS:
+        raise OmapiError("delete of host '{}' failed".format(name))
+    return True
+
+def _omapi_add_host(omapi, name, entry):
+    """
+    Creates host object in running dhcpd from host entry in dhcpd config
+    """
+    import struct
+    from pypureomapi import OmapiMessage, OmapiError, OMAPI_OP_UPDATE, pack_ip, pack_mac
+    mac, ip, statements = _split_dhcp_host(entry)
+    msg = OmapiMessage.open('host')
+    msg.message.append(('create', struct.pack('!I', 1)))
+    msg.message.append(('exclusive', struct.pack('!I', 1)))
+    msg.obj.append(('name', name))
+    msg.obj.append(('hardware-address', pack_mac(mac)))
+    msg.obj.append(('hardware-type', struct.pack('!I', 1)))
+    if bool(ip):
+        msg.obj.append(('ip-address', pack_ip(ip)))
+    if bool(statements):
+        msg.obj.append(('statements', statements))
+    response = omapi.query_server(msg)
+    if response.opcode != OMAPI_OP_UPDATE:
+        raise OmapiError("add of host '{}' failed".format(name))
+
+def _get_zone_serial(content):
+    """
+    Returns SOA serial from content of zone file, 0 if not found
+    """
+    if not content:
+        return 0
+    match = re.search(r'(\d+)\s*; serial number', content)
+    if not match:
+        return 0
+    return int(match.group(1))
 
 class Cluster(Base):
     """
@@ -91,11 +246,13 @@ class Cluster(Base):
                         'torrent_listen_port_min': 7052, 'torrent_listen_port_max': 7200, 'torrent_pidfile': '/run/luna/ltorrent.pid',
                         'lweb_pidfile': '/run/luna/lweb.pid', 'lweb_num_proc': 0, 'cluster_ips': None,
                         'named_include_file': '/etc/named.luna.zones', 'named_zone_dir': '/var/named',
+                        'named_rev_zone_prefix': 24,
                         'dhcp_range_start': None, 'dhcp_range_end': None, 'dhcp_net': None}
             self._logger.debug("mongo_doc: '{}'".format(mongo_doc))
             self._name = name
             self._id = self._mongo_collection.insert(mongo_doc)
             self._DBRef = DBRef(self._collection_name, self._id)
+            ensure_indexes(self._mongo_db)
             logdir = '/var/log/luna'
             try:
                 os.makedirs(logdir)
@@ -116,6 +273,7 @@ class Cluster(Base):
                         'torrent_listen_port_min': type(0), 'torrent_listen_port_max': type(0), 'torrent_pidfile': type(''),
                         'lweb_pidfile': type(''), 'lweb_num_proc': type(0),
                         'cluster_ips': type(''), 'named_include_file': type(''), 'named_zone_dir': type(''),
+                        'named_rev_zone_prefix': type(0),
                         'dhcp_range_start': long, 'dhcp_range_end': long, 'dhcp_net': type('')}
 
         self._logger.debug("Current instance:'{}".format(self._debug_instance()))
@@ -197,8 +355,66 @@ class Cluster(Base):
             val = val[:-1]
             ips = val.split(',')
             return super(Cluster, self).set(key, val)
+        if key == 'named_rev_zone_prefix':
+            if value not in [8, 16, 24]:
+                self._logger.error("Reverse zone prefix should be 8, 16 or 24.")
+                return None
         return super(Cluster, self).set(key, value)
 
+    def _node_counter_key(self, prefix):
+        """
+        Key in cluster document to store last number for given node prefix
+        """
+        return 'nodecounters.' + prefix.replace('.', '_').replace('$', '_')
+
+    def _parse_node_num(self, name, prefix):
+        if not name.startswith(prefix):
+            return None
+        suffix = name[len(prefix):]
+        if not suffix.isdigit():
+            return None
+        return int(suffix)
+
+    def next_node_num(self, prefix):
+        """
+        Atomically increment and return the counter used for node names.
+        Counter is seeded from existing nodes on first use
+        """
+        if not self._id:
+            self._logger.error("Was object deleted?")
+            return None
+        key = self._node_counter_key(prefix)
+        if not self._mongo_collection.find_one({'_id': self._id, key: {'$exists': True}}, {'_id': 1}):
+            max_num = 0
+            regex = '^' + re.escape(prefix) + '[0-9]+$'
+            for doc in self._mongo_db['node'].find({'name': {'$regex': regex}}, {'name': 1, '_id': 0}):
+                max_num = max(max_num, self._parse_node_num(doc['name'], prefix))
+            self._mongo_collection.update({'_id': self._id, key: {'$exists': False}}, {'$set': {key: max_num}}, multi=False, upsert=False)
+        doc = self._mongo_collection.find_and_modify({'_id': self._id}, {'$inc': {key: 1}}, new = True, fields = {key: 1})
+        self.refresh()
+        if not doc:
+            self._logger.error("Unable to get next number for '{}'".format(prefix))
+            return None
+        return doc['nodecounters'][key.split('.', 1)[1]]
+
+    def update_node_num(self, names):
+        """
+        Move counter forward if nodes were created with explicit names
+        """
+        if not self._id:
+            self._logger.error("Was object deleted?")
+            return None
+        prefix = self.get('nodeprefix')
+        nums = [self._parse_node_num(name, prefix) for name in names]
+        nums = [num for num in nums if num is not None]
+        if not bool(nums):
+            return True
+        key = self._node_counter_key(prefix)
+        # if counter is not seeded, it will be seeded from nodes later
+        res = self._mongo_collection.update({'_id': self._id, key: {'$exists': True}}, {'$max': {key: max(nums)}}, multi=False, upsert=False)
+        self.refresh()
+        return not res['err']
+
     def makedhcp(self, netname, startip, endip, no_ha = False):
         from luna.network import Network
         from bson.objectid import ObjectId
@@ -249,7 +465,6 @@ class Cluster(Base):
     def _create_dhcp_config(self, no_ha):
         from luna.network import Network
         from bson.objectid import ObjectId
-        from tornado import template
         import os, base64
         c = {}
         conf_primary = {}
@@ -271,26 +486,138 @@ class Cluster(Base):
         c['NETMASK'] = objnet.get('NETMASK')
         c['NETWORK'] = objnet.get('NETWORK')
         c['hmac_key'] = str(base64.b64encode(bytearray(os.urandom(32))).decode())
-        tloader = template.Loader(self.get('path') + '/templates')
+        # is used to push host entries to dhcpd after restart with this config
+        self._mongo_collection.update({'_id': self._id}, {'$set': {'omapi_key': c['hmac_key']}}, multi=False, upsert=False)
+        self.refresh()
+        c['hosts_file'] = self.get_dhcp_hosts_file()
+        templ = _get_template(self.get('path') + '/templates', 'templ_dhcpd.cfg')
         if self.is_ha() and not no_ha:
-            dhcpd_conf_primary = tloader.load('templ_dhcpd.cfg').generate(c = c, conf_primary = conf_primary, conf_secondary = None)
-            dhcpd_conf_secondary = tloader.load('templ_dhcpd.cfg').generate(c = c, conf_primary = None, conf_secondary = conf_secondary)
-            f1 = open('/etc/dhcp/dhcpd.conf', 'w')
-            f2 = open('/etc/dhcp/dhcpd-secondary.conf', 'w')
-            f1.write(dhcpd_conf_primary)
-            f2.write(dhcpd_conf_secondary)
-            f1.close()
-            f2.close()
+            dhcpd_conf_primary = templ.generate(c = c, conf_primary = conf_primary, conf_secondary = None)
+            dhcpd_conf_secondary = templ.generate(c = c, conf_primary = None, conf_secondary = conf_secondary)
+            _write_file('/etc/dhcp/dhcpd.conf', dhcpd_conf_primary)
+            _write_file('/etc/dhcp/dhcpd-secondary.conf', dhcpd_conf_secondary)
         else:
-            dhcpd_conf = tloader.load('templ_dhcpd.cfg').generate(c = c, conf_primary = None, conf_secondary = None)
-            f1 = open('/etc/dhcp/dhcpd.conf', 'w')
-            f2 = open('/etc/dhcp/dhcpd-secondary.conf', 'w')
-            f1.write(dhcpd_conf)
-            f2.write(dhcpd_conf)
-            f1.close()
-            f2.close()
+            dhcpd_conf = templ.generate(c = c, conf_primary = None, conf_secondary = None)
+            _write_file('/etc/dhcp/dhcpd.conf', dhcpd_conf)
+            _write_file('/etc/dhcp/dhcpd-secondary.conf', dhcpd_conf)
+        # dhcpd is restarted by makedhcp, so nothing to push
+        return self.update_dhcp_hosts(push = False)
+
+    def get_dhcp_hosts_file(self):
+        return self.get('path') + '/dhcpd.hosts'
+
+    def _get_dhcp_hosts(self, node_ids = None):
+        """
+        Returns list of host entries for nodes with known MACs.
+        IP is fixed only if node boots from interface in DHCP network.
+        """
+        from luna.node import Node
+        from bson.objectid import ObjectId
+        if node_ids is None:
+            query = {'node': {'$ne': None}}
+        else:
+            query = {'node': {'$in': [DBRef('node', node_id) for node_id in node_ids]}}
+        macs = {}
+        for doc in self._mongo_db['mac'].find(query, {'_id': 0, 'mac': 1, 'node': 1}):
+            macs[doc['node'].id] = doc['mac']
+        if not macs:
+            return []
+        dhcp_net = None
+        netid = self._get_json().get('dhcp_net')
+        if bool(netid):
+            dhcp_net = self._mongo_db['network'].find_one({'_id': ObjectId(netid)}, {'NETWORK': 1})['NETWORK']
+        hosts = []
+        for doc in self._mongo_db['node'].find({'_id': {'$in': macs.keys()}}, {'name': 1}):
+            node = Node(id = doc['_id'], mongo_db = self._mongo_db)
+            profile = node._get_group_profile()
+            boot_if = profile['boot']['boot_if']
+            ip = None
+            if bool(boot_if) and dhcp_net is not None and profile['networks'].get(boot_if) == dhcp_net:
+                ip = node._get_profile_ip(profile, boot_if)
+            hosts.append({'name': doc['name'], 'mac': macs[doc['_id']], 'ip': ip})
+        return sorted(hosts, key = lambda h: h['name'])
+
+    def update_dhcp_hosts(self, node_ids = None, push = True):
+        """
+        Regenerates host entries for nodes with known MACs.
+        If node_ids is specified only entries of these nodes are updated,
+        and only if host entries were created already by makedhcp.
+        Changed entries are pushed to running dhcpd servers if push is True.
+        """
+        if not bool(self._get_json().get('dhcp_net')):
+            return True
+        hostsfile = self.get_dhcp_hosts_file()
+        c = {}
+        c['frontend_ip'] = self.get('frontend_address')
+        c['frontend_port'] = self.get('frontend_port')
+        templ = _get_template(self.get('path') + '/templates', 'templ_dhcpd_hosts.cfg')
+        # lock file could be created by root, so open it read-only
+        lockfd = os.open(hostsfile + '.lock', os.O_RDONLY | os.O_CREAT, 0644)
+        fcntl.flock(lockfd, fcntl.LOCK_EX)
+        try:
+            old_content = _read_file(hostsfile)
+            if node_ids is None:
+                content = templ.generate(c = c, hosts = self._get_dhcp_hosts())
+                entries = _parse_dhcp_hosts(content)
+            else:
+                if old_content is None:
+                    return True
+                names = [doc['name'] for doc in self._mongo_db['node'].find({'_id': {'$in': list(node_ids)}}, {'name': 1})]
+                entries = _parse_dhcp_hosts(old_content)
+                for name in names:
+                    entries.pop(name, None)
+                new_content = templ.generate(c = c, hosts = self._get_dhcp_hosts(node_ids))
+                entries.update(_parse_dhcp_hosts(new_content))
+                content = templ.generate(c = c, hosts = []) + ''.join([entries[name] for name in sorted(entries)])
+            if content == old_content:
+                return True
+            _write_file(hostsfile, content)
+            self._logger.info("Updated '{}'".format(hostsfile))
+            # dhcpd reads config on start only
+            if push and old_content is not None:
+                return self._push_dhcp_hosts(_parse_dhcp_hosts(old_content), entries)
+        finally:
+            fcntl.flock(lockfd, fcntl.LOCK_UN)
+            os.close(lockfd)
         return True
 
+    def _push_dhcp_hosts(self, old_entries, new_entries):
+        """
+        Pushes changed host entries to running dhcpd servers using OMAPI
+        """
+        changed = sorted([name for name in set(old_entries) | set(new_entries)
+                if old_entries.get(name) != new_entries.get(name)])
+        if not changed:
+            return True
+        key = self._get_json().get('omapi_key')
+        if not bool(key):
+            self._logger.error("OMAPI key is unknown. Run 'luna cluster makedhcp' to apply host entries")
+            return False
+        try:
+            import pypureomapi
+        except ImportError:
+            self._logger.error("pypureomapi is not installed. dhcpd will get host entries on restart only")
+            return False
+        servers = ['127.0.0.1']
+        if self.is_ha():
+            servers = self.get_cluster_ips() or servers
+        res = True
+        for server in servers:
+            try:
+                omapi = pypureomapi.Omapi(server, _omapi_port, 'omapi_key', key, timeout = _omapi_timeout)
+                try:
+                    for name in changed:
+                        if name in old_entries:
+                            _omapi_del_host(omapi, name)
+                        if name in new_entries:
+                            _omapi_add_host(omapi, name, new_entries[name])
+                finally:
+                    omapi.close()
+            except Exception as exc:
+                self._logger.error("Unable to push host entries to dhcpd on '{}': {}".format(server, exc))
+                res = False
+        return res
+
     def get_cluster_ips(self):
         cluster_ips = []
         ips = self.get('cluster_ips')
@@ -345,54 +672,28 @@ class Cluster(Base):
     def makedns(self):
         from luna.network import Network
         from bson.objectid import ObjectId
-        from tornado import template
         import pwd
         import grp
         import os
-        
+
         # get network _id configured for cluster
         obj_json = self._get_json()
-        try:
-            rev_links = obj_json[usedby_key]
-        except:
-            self._logger.error("No IP addresses for network '{}' configured.".format(self.name))
-            return None
-        netids = []
-        for elem in rev_links:
-            if elem == 'network':
-                for netid in rev_links[elem]:
-                    netids.extend([netid])
+        rev_zone_prefix = obj_json.get('named_rev_zone_prefix') or 24
+        netids = [link['DBRef'].id for link in self.get_back_links(collection = 'network')]
 
         # fill network dictionary {'netname': {'ns_hostname': 'servername', 'ns_ip': 'IP', 'hosts' {'name': 'IP'}}}
         networks = {}
         for netid in netids:
-            netobj = Network(id = ObjectId(netid))
+            netobj = Network(id = netid, mongo_db = self._mongo_db)
             networks[netobj.name] = {}
             master_ip = netobj.get('ns_ip')
             networks[netobj.name]['ns_hostname'] = netobj.get('ns_hostname')
             networks[netobj.name]['ns_ip'] = master_ip
             networks[netobj.name]['hosts'] = netobj.resolve_used_ips()
-            # some inout for reverse zones
-            # here is steps to figure out which octets in ipadresses are common for all ips in network.
-            # we can not rely on mask here, as mask can not be devisible by 8 (/12, /15, /21, etc)
-            arr1 = [int(elem) for elem in master_ip.split('.')]
-            logical_arr1 = [True, True, True, True]
-            for host in networks[netobj.name]['hosts']:
-                ip = networks[netobj.name]['hosts'][host]
-                arr2 = [int(elem) for elem in ip.split('.')]
-                logical_arr = [ bool(arr1[n] == arr2[n]) for n in range(len(arr1))]
-                logical_arr2 = [logical_arr[n] & logical_arr1[n] for n in range(len(logical_arr))]
-                arr1 = arr2[:]
-                logical_arr1 = logical_arr2[:]
-            # get fist octet in ip adresses which is changing
-            try:
-                mutable_octet = [i for i in range(len(logical_arr1)) if not logical_arr1[i]][0]
-            except IndexError:
-                mutable_octet = 3
-            # generate zone file name
-            revzonename = '.'.join(list(reversed(master_ip.split('.')[:mutable_octet]))) + ".in-addr.arpa"
-            networks[netobj.name]['mutable_octet'] = mutable_octet
-            networks[netobj.name]['rev_zone_name'] = revzonename
+            # reverse zones are split on octet boundary: network could not
+            # be shorter than its own prefix and zone could not be bigger
+            # than named_rev_zone_prefix
+            networks[netobj.name]['rev_octets'] = min(3, max(netobj.get('PREFIX') // 8, rev_zone_prefix // 8))
 
         # figure out paths
         includefile = self.get('named_include_file')
@@ -404,61 +705,112 @@ class Cluster(Base):
             self._logger.error("named_zone_dir should be configured")
             return None
 
-        # load templates
-        tloader = template.Loader(self.get('path') + '/templates')
-
-        # create include file for named.conf
-        namedconffile = open(includefile, 'w')
-        zonenames = []
-        for network in networks:
-            zonenames.extend([network, networks[network]['rev_zone_name']])
-
-        namedconffile.write(tloader.load('templ_named_conf.cfg').generate(networks = zonenames))
-        namedconffile.close()
+        templ_path = self.get('path') + '/templates'
         nameduid = pwd.getpwnam("named").pw_uid
         namedgid = grp.getgrnam("named").gr_gid
-        os.chown(includefile, 0, namedgid)
-        self._logger.info("Created '{}'".format(includefile))
 
-        # remove zone files
+        # zone name => (template, data)
+        zones = {}
+        for network in sorted(networks):
+            z = {}
+            z['master_hostname'] = networks[network]['ns_hostname']
+            z['master_ip'] = networks[network]['ns_ip']
+            z['hosts'] = networks[network]['hosts']
+            zones[network] = ('templ_zone.cfg', z)
+            # hosts could be spread over several reverse zones and
+            # several networks could share the same reverse zone
+            rev_octets = networks[network]['rev_octets']
+            # zone containing ns_ip is created even if it has no hosts
+            hosts = [(None, networks[network]['ns_ip'])]
+            hosts.extend(sorted(networks[network]['hosts'].items()))
+            for host, ip in hosts:
+                iparr = ip.split('.')
+                revzonename = '.'.join(reversed(iparr[:rev_octets])) + ".in-addr.arpa"
+                if revzonename not in zones:
+                    rz = {}
+                    rz['master_hostname'] = networks[network]['ns_hostname'] + "." + network
+                    rz['master_ip'] = networks[network]['ns_ip']
+                    rz['hosts'] = {}
+                    zones[revzonename] = ('templ_zone_arpa.cfg', rz)
+                if host is None:
+                    continue
+                reverseip = '.'.join(reversed(iparr[rev_octets:]))
+                zones[revzonename][1]['hosts'][host + "." + network] = reverseip
+
+        # create include file for named.conf
+        include_content = _get_template(templ_path, 'templ_named_conf.cfg').generate(networks = sorted(zones.keys()))
+        include_changed = _read_file(includefile) != include_content
+        if include_changed:
+            _write_file(includefile, include_content, 0, namedgid)
+            self._logger.info("Created '{}'".format(includefile))
+
+        # remove zone files which are not used anymore
         filelist = [ f for f in os.listdir(zonedir) if f.endswith(".luna.zone") ]
         for f in filelist:
+            if f[:-len(".luna.zone")] in zones:
+                continue
             filepath = zonedir + "/" + f
             try:
                 os.remove(filepath)
                 self._logger.info("Removed old '{}'".format(filepath))
             except:
                 self._logger.info("Unable to remove '{}'".format(filepath))
-        # create zone files 
-        for network in networks:
-            # create zone
-            z = {}
-            z['master_hostname'] = networks[network]['ns_hostname']
-            z['master_ip'] = networks[network]['ns_ip']
-            z['serial_num'] = 1
-            z['hosts'] = networks[network]['hosts']
-            zonefilepath = zonedir + "/" + network + ".luna.zone"
-            zonefile = open(zonefilepath, 'w')
-            zonefile.write(tloader.load('templ_zone.cfg').generate(z = z))
-            zonefile.close()
-            os.chown(zonefilepath, nameduid, namedgid)
-            self._logger.info("Created '{}'".format(zonefilepath))
-            revzonepath = zonedir + "/" + networks[network]['rev_zone_name'] + ".luna.zone"
-            z['master_hostname'] = networks[network]['ns_hostname'] + "." + network
-            z['hosts'] = {}
-            for host in networks[network]['hosts']:
-                hostname = host + "." + network
-                iparr = [int(elem) for elem in networks[network]['hosts'][host].split('.')]
-                reverseiplist = list(reversed(iparr[networks[network]['mutable_octet']:]))
-                reverseip = '.'.join([str(elem) for elem in reverseiplist])
-                z['hosts'][hostname] = reverseip
-            zonefile = open(revzonepath, 'w') 
-            zonefile.write(tloader.load('templ_zone_arpa.cfg').generate(z = z))
-            zonefile.close()
-            os.chown(revzonepath, nameduid, namedgid)
-            self._logger.info("Created '{}'".format(revzonepath))
-        return True
-
 
+        # create zone files if content was changed
+        min_serial = int(datetime.date.today().strftime('%Y%m%d00'))
+        zonenames = sorted(zones)
+        tasks = [(templ_path, zones[zone][0], zonedir + "/" + zone + ".luna.zone", zones[zone][1], min_serial)
+                 for zone in zonenames]
+        if len(tasks) > _parallel_zones_threshold:
+            pool = multiprocessing.Pool(min(multiprocessing.cpu_count(), len(tasks)))
+            try:
+                rendered = pool.map(_render_zone, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rendered = [_render_zone(task) for task in tasks]
+        changed_zones = []
+        for zone, task, (content, serial) in zip(zonenames, tasks, rendered):
+            if content is None:
+                continue
+            zonefilepath = task[2]
+            _write_file(zonefilepath, content, nameduid, namedgid)
+            self._logger.info("Created '{}' with serial {}".format(zonefilepath, serial))
+            changed_zones.append(zone)
+        return {'zones': changed_zones, 'include_changed': include_changed}
+
+
+class DhcpHostsUpdater(object):
+    """
+    Regenerates dhcpd host entries in background if MACs were
+    assigned by lweb. Is used to keep file rewrites out of requests
+    """
 
+    def __init__(self, mongo_db, logger = None, interval = 10):
+        self._mongo_db = mongo_db
+        self.logger = logger
+        self.interval = interval
+        self.active = True
+        thread = threading.Thread(target=self.run, args=())
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        last_generation = None
+        while self.active:
+            try:
+                generation = get_generation('dhcp_hosts', self._mongo_db)
+                if generation != last_generation:
+                    cluster = Cluster(mongo_db = self._mongo_db)
+                    # file is created by makedhcp
+                    if cluster.is_active() and os.path.exists(cluster.get_dhcp_hosts_file()):
+                        cluster.update_dhcp_hosts()
+                    last_generation = generation
+            except:
+                if self.logger:
+                    self.logger.error("Unable to update DHCP host entries")
+            time.sleep(self.interval)
 
+    def stop(self):
+        self.active = False
@@ -22,5 +22,8 @@ along with Luna.  If not, see <http://www.gnu.org/licenses/>.
 
 use_key = '_use_'
 usedby_key = '_usedby_'
+links_collection = 'links'
 db_name = 'luna'
 torrent_key = 'Luna'
+# threads per lweb process to run blocking MongoDB calls
+lweb_max_workers = 16
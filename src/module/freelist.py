@@ -0,0 +1,173 @@
+'''
+Written by Dmitry Chirikov <dmitry@chirikov.ru>
+This file is part of Luna, cluster provisioning tool
+https://github.com/dchirikov/luna
+
+This file is part of Luna.
+
+Luna is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Luna is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Luna.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+import bisect
+
+class FreeList(object):
+    """
+    Sorted set of free IP ranges. Ranges are kept in two parallel
+    lists of starts and ends, so lookups are done with bisect.
+    Persisted form is the list of {'start': N, 'end': M} as before
+    """
+
+    def __init__(self, freelist = None):
+        self._starts = []
+        self._ends = []
+        for elem in freelist or []:
+            self._starts.append(elem['start'])
+            self._ends.append(elem['end'])
+
+    def to_list(self):
+        return [{'start': self._starts[i], 'end': self._ends[i]} for i in range(len(self._starts))]
+
+    def __len__(self):
+        return len(self._starts)
+
+    @property
+    def first(self):
+        if not self._starts:
+            return None
+        return self._starts[0]
+
+    @property
+    def last(self):
+        if not self._ends:
+            return None
+        return self._ends[-1]
+
+    @property
+    def free_count(self):
+        return sum(self._ends[i] - self._starts[i] + 1 for i in range(len(self._starts)))
+
+    def _find(self, num):
+        """
+        Index of the range containing num or -1
+        """
+        idx = bisect.bisect_right(self._starts, num) - 1
+        if idx >= 0 and num <= self._ends[idx]:
+            return idx
+        return -1
+
+    def is_free(self, num):
+        return self._find(num) >= 0
+
+    def take(self, ip1, ip2 = None):
+        """
+        Mark range ip1..ip2 as used. Whole range should be free
+        """
+        if ip2 is None:
+            ip2 = ip1
+        idx = self._find(ip1)
+        if idx < 0 or ip2 > self._ends[idx]:
+            return False
+        start, end = self._starts[idx], self._ends[idx]
+        new_starts, new_ends = [], []
+        if start < ip1:
+            new_starts.append(start)
+            new_ends.append(ip1 - 1)
+        if ip2 < end:
+            new_starts.append(ip2 + 1)
+            new_ends.append(end)
+        self._starts[idx:idx + 1] = new_starts
+        self._ends[idx:idx + 1] = new_ends
+        return True
+
+    def take_next(self):
+        """
+        Mark first free IP as used and return it
+        """
+        if not self._starts:
+            return None
+        num = self._starts[0]
+        self.take(num)
+        return num
+
+    def take_first(self, count):
+        """
+        Mark 'count' first free IPs as used. IPs are not necessarily contiguous.
+        Returns None if there is not enough free IPs
+        """
+        if self.free_count < count:
+            return None
+        ips = []
+        while len(ips) < count:
+            start = self._starts[0]
+            num = min(count - len(ips), self._ends[0] - start + 1)
+            ips.extend(range(start, start + num))
+            self.take(start, start + num - 1)
+        return ips
+
+    def take_block(self, count):
+        """
+        Mark 'count' contiguous IPs from the first range big enough as used.
+        Returns first IP of the block or None
+        """
+        for idx in range(len(self._starts)):
+            if self._ends[idx] - self._starts[idx] + 1 >= count:
+                start = self._starts[idx]
+                self.take(start, start + count - 1)
+                return start
+        return None
+
+    def release(self, ip1, ip2 = None):
+        """
+        Mark range ip1..ip2 as free, merging with adjacent ranges.
+        Returns False if part of the range was free already
+        """
+        if ip2 is None:
+            ip2 = ip1
+        # ranges which overlap or touch ip1..ip2
+        lo = bisect.bisect_left(self._ends, ip1 - 1)
+        hi = bisect.bisect_right(self._starts, ip2 + 1)
+        overlap = False
+        for idx in range(lo, hi):
+            if self._starts[idx] <= ip2 and self._ends[idx] >= ip1:
+                overlap = True
+                break
+        if lo < hi:
+            start = min(ip1, self._starts[lo])
+            end = max(ip2, self._ends[hi - 1])
+        else:
+            start, end = ip1, ip2
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+        return not overlap
+
+    def set_uplimit(self, border):
+        """
+        Move end of the last free range to the border
+        """
+        if not self._starts or self._starts[-1] > border:
+            return False
+        self._ends[-1] = border
+        return True
+
+    def used_ranges(self, first = 1):
+        """
+        Yield (start, end) for ranges of used IPs between first
+        and the beginning of the last free range
+        """
+        prev = first
+        for idx in range(len(self._starts)):
+            if self._starts[idx] > prev:
+                yield (prev, self._starts[idx] - 1)
+            prev = max(prev, self._ends[idx] + 1)
@@ -30,8 +30,10 @@ import tornado.gen
 import threading
 import datetime
 import time
+import hashlib
+import email.utils
 from bson.dbref import DBRef
-from luna.utils import set_mac_node
+from luna.utils import get_generation, get_generations, get_executor
 
 last_switch_update = None
 lock_last_switch_update = threading.Lock()
@@ -41,6 +43,198 @@ switch_mac_table = None
 lock_switch_mac_table = threading.Lock()
 
 
+# generations of cached data, polled not often than once a second
+_generation_names = ['config', 'nodes']
+_generations = {'polled': 0, 'values': None}
+_generations_lock = threading.Lock()
+
+# rendered iPXE menus {(group, page): (etag, content)}
+_boot_menu_cache = {'generations': None, 'data': None, 'pages': {}}
+_boot_menu_lock = threading.Lock()
+# show nodes split by groups if there are more nodes than this
+boot_menu_page_size = 200
+
+# rendered per-node scripts
+# {(step, node_name): {'content': str, 'deps': {generation: value}, 'checked': generations}}
+_scripts_cache = {}
+_scripts_lock = threading.Lock()
+_scripts_render_locks = {}
+
+_mac_index = None
+_mac_index_lock = threading.Lock()
+
+
+def get_cached_generations(mongo_db, poll_interval = 1):
+    """
+    Returns {name: (value, updated)} for generations used by caches in lweb
+    """
+    with _generations_lock:
+        now = time.time()
+        if _generations['values'] is None or now - _generations['polled'] >= poll_interval:
+            _generations['values'] = get_generations(_generation_names, mongo_db)
+            _generations['polled'] = now
+        return _generations['values']
+
+
+def get_mac_index(mongo_db, aging = 60):
+    """
+    Returns MacIndex of the current process
+    """
+    global _mac_index
+    with _mac_index_lock:
+        if _mac_index is None:
+            _mac_index = MacIndex(mongo_db, aging = aging)
+        return _mac_index
+
+
+class MacIndex(object):
+    """
+    In-memory index to resolve MACs to nodes on discovery step.
+    Changes are polled from MongoDB at most every poll_interval seconds:
+    'mac' and 'switch_mac' by 'updated' field, node ports by 'nodes' generation.
+    Unbound MACs are kept in 'mac' with node = None, so they are dropped
+    from the index on the next poll. Index is fully reloaded
+    every reload_interval seconds, unbound MACs which every index
+    has seen already are deleted then. Learned switch MACs older
+    than aging seconds are ignored.
+    """
+
+    # records written by other clients could come with slightly older 'updated'
+    _overlap = datetime.timedelta(seconds = 5)
+
+    def __init__(self, mongo_db, poll_interval = 1, reload_interval = 300, aging = 60):
+        self._mongo_db = mongo_db
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.aging = datetime.timedelta(seconds = aging)
+        self._lock = threading.Lock()
+        self._macs = {}             # mac => node_id
+        self._switch_macs = {}      # mac => {(switch_id, port, portname): updated}
+        self._ports = {}            # (switch_id, port) => node_id
+        self._nodes_generation = None
+        self._last_mac_update = None
+        self._last_switch_mac_update = None
+        self._last_poll = 0
+        self._last_reload = 0
+        self._polling = False
+
+    def _read(self, collection, projection, since):
+        """
+        Returns (docs, last_update). Documents without 'updated' are
+        returned on full read only, so the time of the read is used as
+        last_update then.
+        """
+        if since is None:
+            query = {}
+            last_update = datetime.datetime.utcnow()
+        else:
+            query = {'updated': {'$gte': since - self._overlap}}
+            last_update = since
+        docs = list(self._mongo_db[collection].find(query, projection))
+        for doc in docs:
+            updated = doc.get('updated')
+            if updated and updated > last_update:
+                last_update = updated
+        return (docs, last_update)
+
+    def _read_ports(self):
+        ports = {}
+        for doc in self._mongo_db['node'].find({'switch': {'$ne': None}}, {'switch': 1, 'port': 1}):
+            if not bool(doc.get('port')):
+                continue
+            ports[(doc['switch'].id, doc['port'])] = doc['_id']
+        return ports
+
+    def _update(self):
+        # MongoDB is queried without holding the lock, so
+        # resolve() in other threads is not blocked meanwhile
+        with self._lock:
+            now = time.time()
+            if self._polling or now - self._last_poll < self.poll_interval:
+                return
+            self._polling = True
+            self._last_poll = now
+            full = now - self._last_reload >= self.reload_interval
+            mac_since = None if full else self._last_mac_update
+            switch_mac_since = None if full else self._last_switch_mac_update
+            nodes_generation = self._nodes_generation
+        try:
+            if full:
+                # indexes which did not poll since then will be fully reloaded anyway
+                oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds = self.reload_interval) - 2 * self._overlap
+                self._mongo_db['mac'].remove({'node': None, 'updated': {'$lt': oldest}})
+            mac_docs, last_mac_update = self._read('mac',
+                {'_id': 0, 'mac': 1, 'node': 1, 'updated': 1}, mac_since)
+            switch_mac_docs, last_switch_mac_update = self._read('switch_mac',
+                {'_id': 0, 'mac': 1, 'switch_id': 1, 'port': 1, 'portname': 1, 'updated': 1},
+                switch_mac_since)
+            generation = get_generation('nodes', self._mongo_db)
+            ports = None
+            if generation != nodes_generation:
+                ports = self._read_ports()
+        except:
+            with self._lock:
+                self._polling = False
+            raise
+        with self._lock:
+            self._polling = False
+            if full:
+                self._macs = {}
+                self._switch_macs = {}
+                self._last_reload = now
+            for doc in mac_docs:
+                if bool(doc.get('node')):
+                    self._macs[doc['mac']] = doc['node'].id
+                else:
+                    self._macs.pop(doc['mac'], None)
+            for doc in switch_mac_docs:
+                entry = (doc['switch_id'], doc.get('port'), doc.get('portname'))
+                self._switch_macs.setdefault(doc['mac'], {})[entry] = doc.get('updated')
+            self._last_mac_update = last_mac_update
+            self._last_switch_mac_update = last_switch_mac_update
+            if ports is not None:
+                self._ports = ports
+                self._nodes_generation = generation
+
+    def set_mac(self, mac, node_id):
+        """
+        Is called when mac was assigned to node in current process
+        """
+        with self._lock:
+            for known_mac in [k for k in self._macs if self._macs[k] == node_id]:
+                self._macs.pop(known_mac)
+            self._macs[mac] = node_id
+
+    def resolve(self, macs):
+        """
+        Returns (node_id, mac, learned), where learned is True
+        if node was found via switch port. (None, None, False) if not found
+        """
+        try:
+            self._update()
+        except:
+            # use what we have if MongoDB is not reachable
+            pass
+        with self._lock:
+            macs = [str(mac).lower() for mac in macs if bool(mac)]
+            for mac in macs:
+                if mac in self._macs:
+                    return (self._macs[mac], mac, False)
+            oldest = datetime.datetime.utcnow() - self.aging
+            for mac in macs:
+                # see also Manager._resolve_macs_in_db
+                entries = [entry for entry, updated in self._switch_macs.get(mac, {}).items()
+                           if updated is None or updated >= oldest]
+                # portnames like 'Gi2/0/26' have priority over port numbers
+                for switch_id, port, portname in entries:
+                    if (switch_id, portname) in self._ports:
+                        return (self._ports[(switch_id, portname)], mac, True)
+                for switch_id, port, portname in entries:
+                    if (switch_id, port) in self._ports:
+                        return (self._ports[(switch_id, port)], mac, True)
+            return (None, None, False)
+
+
 class Manager(tornado.web.RequestHandler):
 
     def initialize(self, params):
@@ -48,15 +242,28 @@ class Manager(tornado.web.RequestHandler):
         self.server_port = params['server_port']
         self.mongo = params['mongo_db']
         self.app_logger = params['app_logger']
+        # learned switch MACs older than this are outdated
+        self.mac_aging = params.get('mac_aging', 60)
 
-    @tornado.web.asynchronous
-    @tornado.gen.engine
+    @tornado.gen.coroutine
     def get(self):
         step = self.get_argument('step')
+        # steps are using blocking pymongo calls, so they are
+        # running in thread pool and return (status, content, headers).
+        # RequestHandler is not thread-safe, so steps do not render templates
+        # but return (template, params, store) as content to render it here
+        executor = get_executor()
+        res = None
 
         if step == 'boot':
-            nodes = luna.list('node')
-            self.render("templ_ipxe.cfg", server_ip = self.server_ip, server_port = self.server_port, nodes = nodes)
+            # known nodes get their name from dhcpd host entries
+            req_nodename = self.get_argument('node', None)
+            group = self.get_argument('group', None)
+            try:
+                page = int(self.get_argument('page', 1))
+            except ValueError:
+                page = 1
+            res = yield executor.submit(self._boot_step, req_nodename, group, page)
 
         if step == 'discovery':
             try:
@@ -70,110 +277,8 @@ class Manager(tornado.web.RequestHandler):
                 req_nodename = self.get_argument('node')
             except:
                 req_nodename = None
-            macs = set(hwdata.split('|'))
-            # enter node name manualy from ipxe
-            if req_nodename:
-                self.app_logger.info("Node '{}' was chosen in iPXE".format(req_nodename))
-                try:
-                    node = luna.Node(name = req_nodename, mongo_db = self.mongo)
-                except:
-                    self.app_logger.error("No such node configured in DB. '{}'".format(req_nodename))
-                    self.send_error(400)
-                    return
-                mac = None
-                for mac in macs:
-                    if bool(mac):
-                        mac = str(mac.lower())
-                        self.app_logger.info("Node '{}' trying to set '{}' as mac".format(req_nodename, mac))
-                        if node.set_mac(mac):
-                            break
-                        self.app_logger.error("MAC: '{}' looks wrong.".format(mac))
-            # need to find node fo given macs.
-            # first step - trying to find in know macs
-            found_node_dbref = None
-            for mac in macs:
-                if not bool(mac):
-                    continue
-                mac = mac.lower()
-                try:
-                    found_node_dbref = self.mongo['mac'].find_one({'mac': mac}, {'_id': 0, 'node': 1})['node']
-                except:
-                    #self.app_logger.error("Mac record exists, but no node configured for given mac '{}'".format(mac))
-                    #self.send_error(404)
-                    #return
-                    continue
-                if bool(found_node_dbref):
-                    break
-
-            # second step. now try to find in learned switch macs if we have switch/port configured
-            if not bool(found_node_dbref):
-                mac_from_cache = None
-                for mac in macs:
-                    #mac_cursor = self.mongo['switch_mac'].find({'mac': mac}).sort([('updated', -1)]).limit(1)
-                    mac_cursor = self.mongo['switch_mac'].find({'mac': mac})
-                    # first search mac in switch_mac using portnames like 'Gi2/0/26'
-                    for elem in mac_cursor:
-                        switch_id = elem['switch_id']
-                        portname = elem['portname']
-                        try:
-                            node_id = self.mongo['node'].find_one({'switch': DBRef('switch', switch_id), 'port': portname}, {})['_id']
-                            mac_from_cache = mac
-                        except:
-                            node_id = None
-                            mac_from_cache = None
-                        if mac_from_cache:
-                            break
-                    if mac_from_cache:
-                        break
-                    mac_cursor = self.mongo['switch_mac'].find({'mac': mac})
-                    # now search mac in switch_mac using portnumbers
-                    for elem in mac_cursor:
-                        switch_id = elem['switch_id']
-                        port = elem['port']
-                        try:
-                            node_id = self.mongo['node'].find_one({'switch': DBRef('switch', switch_id), 'port': port}, {})['_id']
-                            mac_from_cache = mac
-                        except:
-                            node_id = None
-                            mac_from_cache = None
-                        if mac_from_cache:
-                            break
-                    if mac_from_cache:
-                        break
-                if not bool(mac_from_cache):
-                    self.app_logger.info("Cannot find '{}' in learned macs.".format("', '".join([mac for mac in macs])))
-                    # did not find in learned macs
-                    self.send_error(404)
-                    return
-                # here we should have node_id and mac_from_cache
-                try:
-                    node = luna.Node(id = node_id, mongo_db = self.mongo)
-                    set_mac_node(mac_from_cache, node.DBRef)
-                    found_node_dbref = node.DBRef
-                except:
-                    # should not be here
-                    self.app_logger.info("Cannot create node object for '{}' and '{}'".format(found_name_from_learned, self.mongo))
-                    self.send_error(404)
-                    return
-            # here we should have found_node_dbref
-            try:
-                node = luna.Node(id = found_node_dbref.id, mongo_db = self.mongo)
-            except:
-                # should not be here
-                self.app_logger.info("Cannot create node object for '{}' and '{}'".format(found_node_dbref, self.mongo))
-                self.send_error(404)
-                return
-            # found node finally
-            #http_path = "http://" + self.server_ip + ":" + str(self.server_port) + "/boot/"
-            boot_params = node.boot_params
-            if not boot_params['boot_if']:
-                boot_params['ifcfg'] = 'dhcp'
-            else:
-                boot_params['ifcfg'] = boot_params['boot_if'] + ":" + boot_params['ip'] + "/" + str(boot_params['net_prefix'])
-            boot_params['delay'] = 10
-            boot_params['server_ip'] = self.server_ip
-            boot_params['server_port'] = self.server_port
-            self.render("templ_nodeboot.cfg", p = boot_params)
+            res = yield executor.submit(self._discovery_step, set(hwdata.split('|')), req_nodename)
+
         if step == 'install':
             try:
                 node_name = self.get_argument('node')
@@ -182,18 +287,304 @@ class Manager(tornado.web.RequestHandler):
                 #return self.send_error(400)
                 self.send_error(400)
                 return
+            res = yield executor.submit(self._install_step, node_name)
+
+        if res is None:
+            return
+        status, content, headers = res
+        if status != 200:
+            self.send_error(status)
+            return
+        if isinstance(content, tuple):
+            templ, params, store = content
+            content = store(self.render_string(templ, **params), headers)
+        for header in headers:
+            self.set_header(header, headers[header])
+        if self._not_modified(headers):
+            self.set_status(304)
+            self.finish()
+            return
+        self.write(content)
+        self.finish()
+
+    def _not_modified(self, headers):
+        """
+        Checks conditional request against Etag and Last-Modified of the response
+        """
+        etag = headers.get('Etag')
+        if etag is None:
+            return False
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match == etag
+        updated = headers.get('Last-Modified')
+        if_modified_since = self.request.headers.get('If-Modified-Since')
+        if updated and if_modified_since:
+            since = email.utils.parsedate(if_modified_since)
+            if since and datetime.datetime(*since[:6]) >= updated.replace(microsecond = 0):
+                return True
+        return False
+
+    def _boot_step(self, req_nodename, group, page):
+        if req_nodename:
+            content = self._get_nodeboot(req_nodename)
+            if not isinstance(content, int):
+                return (200, content, {})
+            self.app_logger.error("No such node configured in DB. '{}'".format(req_nodename))
+        return self._get_boot_menu(group, page)
+
+    def _discovery_step(self, macs, req_nodename):
+        # enter node name manualy from ipxe
+        if req_nodename:
+            self.app_logger.info("Node '{}' was chosen in iPXE".format(req_nodename))
+            try:
+                node = luna.Node(name = req_nodename, mongo_db = self.mongo)
+            except:
+                self.app_logger.error("No such node configured in DB. '{}'".format(req_nodename))
+                return (400, None, {})
+            mac = None
+            for mac in macs:
+                if bool(mac):
+                    mac = str(mac.lower())
+                    self.app_logger.info("Node '{}' trying to set '{}' as mac".format(req_nodename, mac))
+                    if node.set_mac(mac, update_dhcp = False):
+                        get_mac_index(self.mongo, self.mac_aging).set_mac(mac, node.id)
+                        break
+                    self.app_logger.error("MAC: '{}' looks wrong.".format(mac))
+        # need to find node fo given macs.
+        # first try in-memory index, then database
+        mac_index = get_mac_index(self.mongo, self.mac_aging)
+        node = None
+        node_id, found_mac, learned = mac_index.resolve(macs)
+        if node_id is not None:
+            try:
+                node = luna.Node(id = node_id, mongo_db = self.mongo)
+            except:
+                self.app_logger.info("Index points to missing node for '{}'".format(found_mac))
+                node = None
+        if node is None:
+            node_id, found_mac, learned = self._resolve_macs_in_db(macs)
+            if node_id is None:
+                self.app_logger.info("Cannot find '{}' in learned macs.".format("', '".join([mac for mac in macs])))
+                # did not find in learned macs
+                return (404, None, {})
+            try:
+                node = luna.Node(id = node_id, mongo_db = self.mongo)
+            except:
+                # should not be here
+                self.app_logger.info("Cannot create node object for '{}' and '{}'".format(node_id, self.mongo))
+                return (404, None, {})
+        if learned:
+            # mac was found in switch tables, so remember it
+            node.set_mac(str(found_mac), update_dhcp = False)
+            mac_index.set_mac(found_mac, node.id)
+        # found node finally
+        content = self._get_nodeboot(node.name, node)
+        if isinstance(content, int):
+            return (content, None, {})
+        return (200, content, {})
+
+    def _install_step(self, node_name):
+        def render():
             try:
                 node = luna.Node(name = node_name, mongo_db = self.mongo)
             except:
                 self.app_logger.error("No such node for install step found '{}'.".format(node_name))
-                #return self.send_error(400)
-                self.send_error(400)
-                return
-                #self.finish()
+                return 400
+            deps = self._get_script_deps(node)
             install_params = node.install_params
             if not bool(install_params['torrent']):
-                #return self.send_error(404)
-                self.send_error(404)
-                return
-                #self.finish()
-            self.render("templ_install.cfg", p = install_params, server_ip = self.server_ip, server_port = self.server_port,)
+                return 404
+            return (("templ_install.cfg", {'p': install_params, 'server_ip': self.server_ip, 'server_port': self.server_port}), deps)
+        content = self._get_script(('install', node_name), render)
+        if isinstance(content, int):
+            return (content, None, {})
+        return (200, content, {})
+
+    def _get_boot_menu_data(self):
+        """
+        Returns {'nodes': [names], 'groups': {group: [names]}}
+        """
+        groups = {}
+        for doc in self.mongo['group'].find({}, {'name': 1}):
+            groups[doc['_id']] = doc['name']
+        data = {'nodes': [], 'groups': {}}
+        for doc in self.mongo['node'].find({}, {'name': 1, 'group': 1}):
+            data['nodes'].append(str(doc['name']))
+            try:
+                group = str(groups[doc['group'].id])
+            except:
+                continue
+            data['groups'].setdefault(group, []).append(str(doc['name']))
+        data['nodes'].sort()
+        for group in data['groups']:
+            data['groups'][group].sort()
+        return data
+
+    def _get_boot_menu(self, group, page):
+        """
+        Returns iPXE menu as (status, content, headers). Rendered menus are cached until nodes
+        or groups are changed. If there are too many nodes,
+        menu is split by groups and pages.
+        Conditional requests are checked by get() using Etag and Last-Modified.
+        """
+        generations = get_cached_generations(self.mongo)
+        with _boot_menu_lock:
+            if _boot_menu_cache['generations'] != generations:
+                _boot_menu_cache['data'] = self._get_boot_menu_data()
+                _boot_menu_cache['pages'] = {}
+                _boot_menu_cache['generations'] = generations
+            data = _boot_menu_cache['data']
+        # normalize request, so cache could not be filled with arbitrary keys
+        pages = 1
+        if group is None:
+            page = 1
+        elif group not in data['groups']:
+            return (404, None, {})
+        else:
+            pages = max(1, (len(data['groups'][group]) + boot_menu_page_size - 1) // boot_menu_page_size)
+            page = min(max(1, page), pages)
+        updated = [val[1] for val in generations.values() if val[1] is not None]
+        headers = {}
+        if updated:
+            headers['Last-Modified'] = max(updated)
+        with _boot_menu_lock:
+            cached = _boot_menu_cache['pages'].get((group, page))
+        if cached:
+            headers['Etag'] = cached[0]
+            return (200, cached[1], headers)
+        params = {'server_ip': self.server_ip, 'server_port': self.server_port,
+                  'nodes': None, 'groups': None, 'group': group, 'page': page, 'pages': pages}
+        if group is None and len(data['nodes']) <= boot_menu_page_size:
+            params['nodes'] = data['nodes']
+        elif group is None:
+            params['groups'] = sorted(data['groups'])
+        else:
+            start = (page - 1) * boot_menu_page_size
+            params['nodes'] = data['groups'][group][start:start + boot_menu_page_size]
+
+        def store(content, headers):
+            cached = ('"' + hashlib.md5(content).hexdigest() + '"', content)
+            with _boot_menu_lock:
+                if _boot_menu_cache['generations'] == generations:
+                    _boot_menu_cache['pages'][(group, page)] = cached
+            headers['Etag'] = cached[0]
+            return content
+        return (200, ("templ_ipxe.cfg", params, store), headers)
+
+    def _resolve_macs_in_db(self, macs):
+        """
+        Slow path of discovery. Returns (node_id, mac, learned)
+        """
+        # first step - trying to find in know macs
+        for mac in macs:
+            if not bool(mac):
+                continue
+            mac = mac.lower()
+            doc = self.mongo['mac'].find_one({'mac': mac}, {'_id': 0, 'node': 1})
+            if doc and bool(doc.get('node')):
+                return (doc['node'].id, mac, False)
+        # second step. now try to find in learned switch macs if we have switch/port configured
+        # first search mac in switch_mac using portnames like 'Gi2/0/26', then using portnumbers
+        # entries older than aging are ignored, as in MacIndex
+        oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds = self.mac_aging)
+        for mac in macs:
+            if not bool(mac):
+                continue
+            mac = mac.lower()
+            query = {'mac': mac, '$or': [{'updated': {'$gte': oldest}}, {'updated': None}]}
+            for key in ['portname', 'port']:
+                for elem in self.mongo['switch_mac'].find(query):
+                    node = self.mongo['node'].find_one({'switch': DBRef('switch', elem['switch_id']), 'port': elem[key]}, {})
+                    if node:
+                        return (node['_id'], mac, True)
+        return (None, None, False)
+
+    def _get_script(self, key, render):
+        """
+        Returns script from the cache. render() returns
+        ((template, params), deps), where deps are generations of the objects
+        the script depends on, or error code which is not cached.
+        Cached script is re-checked against its deps only if global
+        generations were changed since the last check. For concurrent
+        requests of the same key render() is called only once.
+        Returns rendered script, error code or (template, params, store)
+        if template was not rendered yet, see get()
+        """
+        generations = get_cached_generations(self.mongo)
+        with _scripts_lock:
+            entry = _scripts_cache.get(key)
+        if entry is not None:
+            if entry['checked'] == generations:
+                return self._script_content(entry)
+            current = get_generations(entry['deps'].keys(), self.mongo)
+            if all([current[name][0] == entry['deps'][name] for name in entry['deps']]):
+                with _scripts_lock:
+                    entry['checked'] = generations
+                return self._script_content(entry)
+        with _scripts_lock:
+            render_lock = _scripts_render_locks.setdefault(key, threading.Lock())
+        with render_lock:
+            with _scripts_lock:
+                cached = _scripts_cache.get(key)
+                if cached is not None and cached is not entry and cached['checked'] == generations:
+                    return self._script_content(cached)
+            res = render()
+            with _scripts_lock:
+                if isinstance(res, tuple):
+                    (templ, params), deps = res
+                    entry = {'content': None, 'templ': templ, 'params': params, 'deps': deps, 'checked': generations}
+                    _scripts_cache[key] = entry
+                else:
+                    entry = None
+                    _scripts_cache.pop(key, None)
+                _scripts_render_locks.pop(key, None)
+        if entry is None:
+            return res
+        return self._script_content(entry)
+
+    def _script_content(self, entry):
+        """
+        Returns rendered script of the cache entry or (template, params, store)
+        """
+        with _scripts_lock:
+            if entry['content'] is not None:
+                return entry['content']
+
+        def store(content, headers):
+            with _scripts_lock:
+                entry['content'] = content
+            return content
+        return (entry['templ'], entry['params'], store)
+
+    def _get_script_deps(self, node):
+        """
+        Returns current values of generations node's scripts depend on.
+        Should be read before rendering
+        """
+        generations = get_generations(node.dependency_generations(), self.mongo)
+        return dict([(name, generations[name][0]) for name in generations])
+
+    def _get_nodeboot(self, name, node = None):
+        """
+        Returns boot script for the node or 404 if there is no such node
+        """
+        def render():
+            obj = node
+            if obj is None:
+                try:
+                    obj = luna.Node(name = name, mongo_db = self.mongo)
+                except:
+                    return 404
+            deps = self._get_script_deps(obj)
+            #http_path = "http://" + self.server_ip + ":" + str(self.server_port) + "/boot/"
+            boot_params = obj.boot_params
+            if not boot_params['boot_if']:
+                boot_params['ifcfg'] = 'dhcp'
+            else:
+                boot_params['ifcfg'] = boot_params['boot_if'] + ":" + boot_params['ip'] + "/" + str(boot_params['net_prefix'])
+            boot_params['delay'] = 10
+            boot_params['server_ip'] = self.server_ip
+            boot_params['server_port'] = self.server_port
+            return (("templ_nodeboot.cfg", {'p': boot_params}), deps)
+        return self._get_script(('boot', name), render)
@@ -22,11 +22,15 @@ along with Luna.  If not, see <http://www.gnu.org/licenses/>.
 
 from config import *
 import logging
+import pymongo
 import struct
 import socket
 from bson.dbref import DBRef
 from luna.base import Base
 from luna.cluster import Cluster
+from luna.freelist import FreeList
+
+_ip_struct = struct.Struct('>L')
 
 class Network(Base):
     """
@@ -34,6 +38,7 @@ class Network(Base):
 
     """
     _logger = logging.getLogger(__name__)
+    _net_params = None
     def __init__(self, name = None, mongo_db = None, create = False, id = None, NETWORK = None, PREFIX = None, ns_hostname = None, ns_ip = None):
         """
         create  - should be True if we need create osimage
@@ -53,7 +58,7 @@ class Network(Base):
             if not ns_hostname:
                 ns_hostname = self._guess_ns_hostname()
             freelist = [{'start': 1, 'end': (1<<(32-PREFIX))-2}]
-            mongo_doc = {'name': name, 'NETWORK': num_net, 'PREFIX': PREFIX, 'freelist': freelist, 'ns_hostname': ns_hostname, 'ns_ip': None}
+            mongo_doc = {'name': name, 'NETWORK': num_net, 'PREFIX': PREFIX, 'freelist': freelist, 'freelist_version': 0, 'ns_hostname': ns_hostname, 'ns_ip': None}
             self._logger.debug("mongo_doc: '{}'".format(mongo_doc))
             self._name = name
             self._id = self._mongo_collection.insert(mongo_doc)
@@ -87,9 +92,21 @@ class Network(Base):
                 return guessed_name
         return ns_hostname
 
+    def _get_net_params(self):
+        """
+        Returns (NETWORK, PREFIX, mask) as integers.
+        Values are cached until NETWORK or PREFIX are changed
+        """
+        if self._net_params is None:
+            obj_json = self._get_json()
+            prefix = obj_json['PREFIX']
+            mask = ((1<<32) - 1) ^ ((1<<(32-prefix)) - 1)
+            self._net_params = (obj_json['NETWORK'], prefix, mask)
+        return self._net_params
+
     def absnum_to_ip(self, numip):
         try:
-            ip = socket.inet_ntoa(struct.pack('>L', numip))
+            ip = socket.inet_ntoa(_ip_struct.pack(numip))
         except:
             self._logger.error("Cannot compute numeric ip = '{}' to human readable".format(numip))
             return None
@@ -97,20 +114,20 @@ class Network(Base):
 
     def ip_to_absnum(self, ip):
         try:
-            absnum = struct.unpack('>L', (socket.inet_aton(ip)))[0]
+            absnum = _ip_struct.unpack(socket.inet_aton(ip))[0]
         except:
             self._logger.error("Cannot compute ip = '{}'".format(ip))
             return None
         return long(absnum)
 
     def relnum_to_ip(self, numip):
-        num_net = self._get_json()['NETWORK']
+        num_net = self._get_net_params()[0]
         return self.absnum_to_ip(num_net + numip)
 
     def ip_to_relnum(self, ip):
-        num_net = self._get_json()['NETWORK']
+        num_net, prefix, mask = self._get_net_params()
         num_ip = self.ip_to_absnum(ip)
-        if not self.ip_in_net(ip):
+        if num_ip is None or (num_ip & mask) != (num_net & mask):
             self._logger.error("Ip = '{}' is not in network.".format(ip))
             return None
         return long(num_ip - num_net)
@@ -134,13 +151,14 @@ class Network(Base):
         return long(net_num & mask_num)
 
     def ip_in_net(self, ip):
-        if type(ip) is int:
+        if type(ip) is int or type(ip) is long:
             num_ip = ip
         else:
             num_ip = self.ip_to_absnum(ip)
-        num_net = self._get_json()['NETWORK']
-        prefix = self._get_json()['PREFIX']
-        return self.get_base_net(num_net, prefix) == self.get_base_net(ip, prefix)
+        if num_ip is None:
+            return False
+        num_net, prefix, mask = self._get_net_params()
+        return (num_ip & mask) == (num_net & mask)
 
     def set(self, key, value):
         if not bool(key) or type(key) is not str :
@@ -149,7 +167,7 @@ class Network(Base):
         if not key in self._keylist:
             self._logger.error("Cannot change '{}' field".format(key))
             return None
-        obj_json = self._get_json()
+        mongo_doc = {}
         if key == 'ns_ip':
             ns_ip = self.ip_to_relnum(value)
             if not ns_ip:
@@ -163,18 +181,17 @@ class Network(Base):
             if bool(old_ip):
                 self.release_ip(old_ip)
             self.reserve_ip(ns_ip)
-            obj_json = self._get_json()
-            obj_json['ns_ip'] = ns_ip
+            mongo_doc['ns_ip'] = ns_ip
         if key == 'ns_hostname':
-            obj_json['ns_hostname'] = value
+            mongo_doc['ns_hostname'] = value
         if key == 'NETWORK':
             prefix = self._get_json()['PREFIX']
             network = self.get_base_net(value, prefix)
             if not bool(network):
                 self._logger.error("Cannot compute NETWORK for entered '{}'".format(value))
                 return None
-            obj_json['NETWORK'] = network
-            obj_json['PREFIX'] = prefix
+            mongo_doc['NETWORK'] = network
+            mongo_doc['PREFIX'] = prefix
         if key == 'PREFIX':
             network = self._get_json()['NETWORK']
             new_network = self.get_base_net(network, value)
@@ -184,141 +201,274 @@ class Network(Base):
             if not self._set_uplimit_ip(value):
                 self._logger.error("Cannot set PREFIX as some IPs are reserved out of the new border.".format(value))
                 raise RuntimeError
-            # self._set_uplimit_ip updated mongo doc already, so need to update
-            obj_json = self._get_json()
-            obj_json['NETWORK'] = network
-            obj_json['PREFIX'] = value
-        ret = self._mongo_collection.update({'_id': self._id}, {'$set': obj_json}, multi=False, upsert=False)
+            mongo_doc['NETWORK'] = network
+            mongo_doc['PREFIX'] = value
+        ret = self._mongo_collection.update({'_id': self._id}, {'$set': mongo_doc}, multi=False, upsert=False)
+        self.refresh()
+        if 'NETWORK' in mongo_doc:
+            self._net_params = None
+        self._config_changed()
         return not ret['err']
 
     def get(self, key):
         if not key or type(key) is not str:
             return None
-        obj_json = self._get_json()
         if key == 'NETWORK':
-            return self.absnum_to_ip(obj_json[key])
+            return self.absnum_to_ip(self._get_net_params()[0])
         if key == 'NETMASK':
-            prefix = obj_json['PREFIX']
-            prefix_num = ((1<<32) -1) ^ ((1<<(33-prefix)-1) -1)
-            return socket.inet_ntoa(struct.pack('>L', (prefix_num)))
+            return self.absnum_to_ip(self._get_net_params()[2])
         if key == 'PREFIX':
-            return obj_json['PREFIX']
+            return self._get_net_params()[1]
         if key == 'ns_ip':
-            return self.relnum_to_ip(obj_json['ns_ip'])
+            return self.relnum_to_ip(self._get_json()['ns_ip'])
         return super(Network, self).get(key)
 
-    def _get_next_ip(self):
+    def _get_free_list(self):
         obj_json = self._get_json()
         try:
-            freelist = obj_json['freelist']
-        except:
+            return FreeList(obj_json['freelist'])
+        except KeyError:
             return None
-        if not bool(freelist):
-            self._logger.error("No more IPs avalilable")
+
+    def _modify_free_list(self, func, retries = 100, tag = None):
+        """
+        Calls func(freelist) for the fresh copy of the list of free IPs
+        and saves it only if nobody changed it in between.
+        Retries if document was modified concurrently.
+        If func returns None, nothing is saved.
+        If tag is specified, result is saved in 'freelist_changes' in
+        the same write, and the change is not applied for the same tag
+        again, saved result is returned instead
+        """
+        self._logger.debug("Arguments to function '{}".format(self._debug_function()))
+        if not self._id:
+            self._logger.error("Was object deleted?")
             return None
-        first_elem = freelist[0]
-        if first_elem['start'] == first_elem['end']:
-            freelist.pop(0)
-            res = self._save_free_list(freelist)
-            if not res:
-                self._logger.error("Error during saving to MongoDB")
+        for attempt in range(retries):
+            self.refresh()
+            obj_json = self._get_json()
+            if tag is not None:
+                done = (obj_json.get('freelist_changes') or {}).get(tag)
+                if done is not None:
+                    return done
+            try:
+                freelist = FreeList(obj_json['freelist'])
+            except KeyError:
                 return None
-            return first_elem['start']
-        freelist[0] = {'start': first_elem['start'] + 1, 'end': first_elem['end']}
-        res = self._save_free_list(freelist)
-        if not res:
-            self._logger.error("Error during saving to MongoDB")
-            return None
-        return first_elem['start']
+            res = func(freelist)
+            if res is None:
+                return None
+            query = {'_id': self._id}
+            if 'freelist_version' in obj_json:
+                query['freelist_version'] = obj_json['freelist_version']
+            else:
+                query['freelist_version'] = {'$exists': False}
+            mongo_doc = {'freelist': freelist.to_list()}
+            if tag is not None:
+                mongo_doc['freelist_changes.' + tag] = res
+            ret = self._mongo_collection.update(query,
+                    {'$set': mongo_doc, '$inc': {'freelist_version': 1}},
+                    multi=False, upsert=False)
+            self.refresh()
+            if ret['err']:
+                self._logger.error("Error while saving list of free IPs: '{}'".format(ret['err']))
+                return None
+            if ret['n']:
+                return res
+            self._logger.debug("List of free IPs was changed concurrently. Retrying")
+        self._logger.error("Unable to save list of free IPs after {} attempts".format(retries))
+        return None
 
-    def _get_ip(self, ip1, ip2 = None):
+    def _get_next_ip(self):
+        def take_next(freelist):
+            num = freelist.take_next()
+            if num is None:
+                self._logger.error("No more IPs avalilable")
+            return num
+        return self._modify_free_list(take_next)
 
-        def change_elem(num, elem):
-            find = False
-            if num not in range(elem['start'], elem['end']+1):
-                return ( find, [elem] )
-            find = True
-            if elem['end'] == elem['start']:
-                return ( find, None )
-            if num == elem['start']:
-                return ( find, [{'start': elem['start'] + 1, 'end': elem['end']}] )
-            if num == elem['end']:
-                return ( find, [{'start': elem['start'], 'end': elem['end'] - 1}] )
-            return ( find, [{'start': elem['start'], 'end': num-1}, {'start': num+1, 'end': elem['end']}] )
- 
-        obj_json = self._get_json()
+    def _get_ip(self, ip1, ip2 = None):
         if not bool(ip2):
             ip2 = ip1
-        try:
-            freelist = obj_json['freelist']
-        except:
-            return None
-        if not bool(freelist):
-            self._logger.error("No more IPs avalilable")
-            return None
-        start = freelist[0]['start']
-        finish = freelist[-1]['end']
-        if ip1 not in range(start, finish + 1):
-            self._logger.error("Requested IP '{}' is out of range".format(ip1))
-            return None
-        if ip2 not in range(start, finish + 1):
-            self._logger.error("Requested IP '{}' is out of range".format(ip2))
-            return None
-        # find if ip1 and ip2 fit in any free range:
-        for elem in freelist:
-            if ip1 in range(elem['start'], elem['end']+1) and ip2 not in range(elem['start'], elem['end']+1):
-                self._logger.error("No free range for IPs.")
+
+        def take(freelist):
+            if not len(freelist):
+                self._logger.error("No more IPs avalilable")
                 return None
-        ret_array = [0 ,0]
-        for num in range(ip1, ip2+1):
-            new_list = []
-            find = False
-            for elem in freelist:
-                new_elem = change_elem(num, elem)
-                if new_elem[0]:
-                    if num == ip1:
-                        ret_array = [num, num]
-                    ret_array[1] = num
-                    find = True
-                if not new_elem[1]:
-                    continue
-                new_list.extend(new_elem[1])
-            freelist = new_list[:]
-        ret = self._save_free_list(freelist)
-        if not ret:
-            return None
-        if find:
-            if ret_array[0] == ret_array[1]:
-                return ret_array[0]
-            else:
-                return ret_array
-        self._logger.error("Requested IP '{}' is out of free range".format(num))
-        return None
+            for num in (ip1, ip2):
+                if num < freelist.first or num > freelist.last:
+                    self._logger.error("Requested IP '{}' is out of range".format(num))
+                    return None
+            if not freelist.take(ip1, ip2):
+                self._logger.error("Requested IP '{}' is out of free range".format(ip1))
+                return None
+            if ip1 == ip2:
+                return ip1
+            return [ip1, ip2]
+        return self._modify_free_list(take)
  
     def _set_uplimit_ip(self, prefix):
         border = (1<<(32-prefix))-1
-        obj_json = self._get_json()
-        try:
-            freelist = obj_json['freelist']
-        except:
+
+        def set_uplimit(freelist):
+            if not freelist.set_uplimit(border):
+                self._logger.error("Cannot cut list of free IPs. Requested cut to '{}'".format(border))
+                return None
+            return True
+        return self._modify_free_list(set_uplimit)
+
+    def reserve_block(self, count, contiguous = True, release = None, tag = None):
+        """
+        Reserve 'count' IPs with one write of the list of free IPs.
+        contiguous=False allows to collect IPs from several free ranges.
+        IPs from 'release' list are freed in the same write before reserving.
+        With tag IPs are reserved only once, see _modify_free_list.
+        Returns the list of relative numbers or None
+        """
+        if type(count) is not int or count < 1:
+            self._logger.error("Number of IPs should be positive integer")
             return None
-        last_elem = freelist[-1]
-        if last_elem['start'] > border:
-            self._logger.error("Cannot cut list of free IPs. Requested cut to '{}'".format(border))
-            return False
-        freelist[-1] = {'start': last_elem['start'], 'end': border}
-        return self._save_free_list(freelist)
 
-    def _save_free_list(self, freelist):
-        self._logger.debug("Arguments to function '{}".format(self._debug_function()))
+        def take(freelist):
+            for num in release or []:
+                if not freelist.release(num):
+                    self._logger.warning("IP '{}' was not reserved".format(self.relnum_to_ip(num)))
+            if contiguous:
+                start = freelist.take_block(count)
+                if start is None:
+                    self._logger.error("No free block of {} IPs available".format(count))
+                    return None
+                return range(start, start + count)
+            ips = freelist.take_first(count)
+            if ips is None:
+                self._logger.error("Not enough free IPs. Requested {}, available {}".format(count, freelist.free_count))
+            return ips
+        return self._modify_free_list(take, tag = tag)
+
+    def release_ips(self, nums, tag = None):
+        """
+        Release the list of relative numbers with one write.
+        With tag IPs are released only once, see _modify_free_list
+        """
+        def release(freelist):
+            res = True
+            for num in nums:
+                if not freelist.release(num):
+                    self._logger.error("Cannot release IP. '{}' is already free".format(self.relnum_to_ip(num)))
+                    res = False
+            return res
+        return self._modify_free_list(release, tag = tag)
+
+    def forget_free_list_changes(self, tags):
+        """
+        Drop saved results of tagged changes of the list of free IPs
+        """
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        res = self._mongo_collection.update({'_id': self._id}, {'$set': {'freelist': freelist}}, multi=False, upsert=False)
-        if res['err']:
-            self._logger.error("Error while saving list of free IPs: '{}'".format(freelist))
-        return not res['err']
- 
+        mongo_doc = dict([('freelist_changes.' + tag, '') for tag in tags])
+        self._mongo_collection.update({'_id': self._id}, {'$unset': mongo_doc}, multi=False, upsert=False)
+        self.refresh()
+        return True
+
+    def renumber_nodes(self, entries, release = None, dry_run = False, ips = None):
+        """
+        Assign new IPs from the network to the nodes.
+        entries - list of (node_json, interface), interface is None for BMC
+        release - relative numbers to free in the same write
+        ips - relative numbers already reserved for the entries
+        All IPs are reserved with one write and nodes are updated
+        in one bulk operation. With dry_run nothing is changed.
+        Returns list of {'name', 'interface', 'bmc', 'old', 'new'}
+        with relative numbers
+        """
+        from luna.utils import bump_generation, object_generation
+        count = len(entries)
+        if not count:
+            return []
+        if ips is not None:
+            if len(ips) != count:
+                self._logger.error("Number of reserved IPs does not match number of nodes")
+                return None
+            new_ips = ips
+        elif dry_run:
+            freelist = self._get_free_list()
+            for num in release or []:
+                freelist.release(num)
+            new_ips = freelist.take_first(count)
+            if new_ips is None:
+                self._logger.error("Not enough free IPs. Requested {}, available {}".format(count, freelist.free_count))
+                return None
+        else:
+            new_ips = self.reserve_block(count, contiguous = False, release = release)
+            if not bool(new_ips):
+                return None
+        diff = []
+        updates = {}
+        for (node_json, interface), ip in zip(entries, new_ips):
+            node_interfaces = node_json.get('interfaces')
+            if interface is None:
+                old_ip = node_json.get('bmcnetwork')
+                updates.setdefault(node_json['_id'], {})['bmcnetwork'] = ip
+            else:
+                old_ip = (node_interfaces or {}).get(interface)
+                mongo_doc = updates.setdefault(node_json['_id'], {})
+                if type(node_interfaces) is dict:
+                    mongo_doc['interfaces.' + interface] = ip
+                else:
+                    mongo_doc.setdefault('interfaces', {})[interface] = ip
+            diff.append({'name': node_json['name'], 'interface': interface, 'bmc': interface is None,
+                    'old': old_ip, 'new': ip})
+        if not dry_run:
+            bulk = self._mongo_db['node'].initialize_unordered_bulk_op()
+            for node_id in updates:
+                bulk.find({'_id': node_id}).update({'$set': updates[node_id]})
+            bulk.execute()
+            bump_generation('nodes', self._mongo_db)
+            # nodes depend on network, so their cached scripts are outdated
+            bump_generation(object_generation(self._collection_name, self._id), self._mongo_db)
+        return diff
+
+    def renumber(self, dry_run = False):
+        """
+        Renumber all nodes in the network to the beginning of the
+        free space in the order of names, e.g. before reducing PREFIX
+        """
+        group_ids = [link['DBRef'].id for link in self.get_back_links(collection = 'group')]
+        group_ifs = {}
+        for group_json in self._mongo_db['group'].find({'_id': {'$in': group_ids}}, {'interfaces': 1, 'bmcnetwork': 1}):
+            interfaces = group_json.get('interfaces') or {}
+            ifs = [interface for interface in interfaces
+                    if bool(interfaces[interface]['network']) and interfaces[interface]['network'].id == self.id]
+            bmcnetwork = group_json.get('bmcnetwork')
+            if bool(bmcnetwork) and bmcnetwork.id == self.id:
+                ifs.append(None)
+            if bool(ifs):
+                group_ifs[group_json['_id']] = ifs
+        entries = []
+        release = []
+        if bool(group_ifs):
+            group_dbrefs = [DBRef('group', group_id) for group_id in group_ifs]
+            cursor = self._mongo_db['node'].find({'group': {'$in': group_dbrefs}},
+                    {'name': 1, 'group': 1, 'interfaces': 1, 'bmcnetwork': 1}).sort('name', pymongo.ASCENDING)
+            for node_json in cursor:
+                for interface in group_ifs[node_json['group'].id]:
+                    if interface is None:
+                        old_ip = node_json.get('bmcnetwork')
+                    else:
+                        old_ip = (node_json.get('interfaces') or {}).get(interface)
+                    if bool(old_ip):
+                        release.append(old_ip)
+                    entries.append((node_json, interface))
+        diff = self.renumber_nodes(entries, release, dry_run)
+        if diff is None:
+            return None
+        for elem in diff:
+            if bool(elem['old']):
+                elem['old'] = self.relnum_to_ip(elem['old'])
+            elem['new'] = self.relnum_to_ip(elem['new'])
+        return diff
+
     def reserve_ip(self, ip1 = None, ip2 = None, ignore_errors = True):
         if type(ip1) is str:
             ip1 = self.ip_to_relnum(ip1)
@@ -346,94 +496,88 @@ class Network(Base):
                 return None
         if type(ip2) is str:
             ip2 = self.ip_to_relnum(ip2)
-        obj_json = self._get_json()
-        try:
-            freelist = obj_json['freelist']
-        except:
-            return None
-        res = True
-        for num in range(ip1, ip2 + 1):
-            insert_elem = {'start': num, 'end': num}
-            filled_list = []
-            for elem in freelist:
-                try:
-                    prev_end = filled_list[-1]['end']
-                except:
-                    prev_end = 0
-                next_start = elem['start']
-                if num in range(prev_end + 1, next_start):
-                    filled_list.extend([insert_elem])
-                filled_list.extend([elem])
-            prefix = self._get_json()['PREFIX']
-            upborder = (1<<(32-prefix))-1
-            if num <= upborder and num > freelist[-1]['end']:
-                filled_list.extend([insert_elem])
-            if len(freelist) == len(filled_list):
-                self._logger.error("Cannot release IP. '{}' is already in list: '{}'".format(num, freelist))
-                res = False
-                next
-                #return False
-            defrag_list = []
-            defrag_list.extend([filled_list.pop(0)])
-            for key in filled_list:
-                if defrag_list[-1]['end'] == (key['start'] - 1):
-                    defrag_list[-1]['end'] = key['end']
-                else:
-                    defrag_list.extend([key])
-            freelist = defrag_list[:]
-        self._save_free_list(freelist)
-        return res
+        prefix = self._get_json()['PREFIX']
+        upborder = (1<<(32-prefix))-1
+        if ip1 < 1 or ip2 > upborder:
+            self._logger.error("Cannot release IP. Range '{}'-'{}' is out of network".format(ip1, ip2))
+            return False
+
+        def release(freelist):
+            res = freelist.release(ip1, ip2)
+            if not res:
+                self._logger.error("Cannot release IP. Part of '{}'-'{}' is already free".format(ip1, ip2))
+            return res
+        return self._modify_free_list(release)
  
+    def iter_used_ips(self):
+        """
+        Yields reserved IPs in human readable form. IPs are computed
+        from the gaps in the list of free IPs, network is read once
+        """
+        freelist = self._get_free_list()
+        if freelist is None:
+            return
+        num_net = self._get_net_params()[0]
+        pack = _ip_struct.pack
+        for start, end in freelist.used_ranges():
+            for i in xrange(num_net + start, num_net + end + 1):
+                yield socket.inet_ntoa(pack(i))
+
     def get_used_ips(self):
-        obj_json = self._get_json()
-        try:
-            freelist = obj_json['freelist'][:]
-        except:
+        if self._get_free_list() is None:
             return None
-        lastip = freelist[-1]['start']
-        ips = []
-        for i in range(1,lastip):
-            if i in range(freelist[0]['start'], freelist[0]['end']+1):
-                continue
-            if i > freelist[0]['end']:
-                freelist.pop(0)
-            ips.extend([self.relnum_to_ip(i)])
-        return ips
+        return list(self.iter_used_ips())
     
     def resolve_used_ips(self):
-        from luna.node import Group, Node
-        from luna.switch import Switch
-        from luna.otherdev import OtherDev
-        from bson.objectid import ObjectId
+        """
+        Returns {name: ip} for all nodes, switches and other devices
+        in the network. Uses a few projected queries instead of
+        instantiating every object
+        """
         obj_json = self._get_json()
-        try:
-            rev_links = obj_json[usedby_key]
-        except:
-            self._logger.error("No IP addresses for network '{}' configured.".format(self.name))
-            return {}
         out_dict = {}
 
         def add_to_out_dict(name, ip):
+            if not bool(ip):
+                return
             try:
                 out_dict[name]
                 self._logger.error("Duplicate name '{}' in network '{}' detected".format(name, self.name))
             except:
                 out_dict[name] = self.relnum_to_ip(ip)
 
-        for elem in rev_links:
-            if elem == "group":
-                for grp_id in rev_links[elem]:
-                    group = Group(id = ObjectId(grp_id), mongo_db = self._mongo_db)
-                    tmp_dict = group.get_rel_ips_for_net(self.id)
-                    for nodename in tmp_dict:
-                        add_to_out_dict(nodename, tmp_dict[nodename])
-            if elem == "switch":
-                for switch_id in rev_links[elem]:
-                    switch = Switch(id = ObjectId(switch_id), mongo_db = self._mongo_db)
-                    add_to_out_dict(switch.name, switch.get_rel_ip())
-            if elem == "otherdev":
-                for otherdev_id in rev_links[elem]:
-                    otherdev = OtherDev(id = ObjectId(otherdev_id), mongo_db = self._mongo_db)
-                    add_to_out_dict(otherdev.name, otherdev.get_ip(self.id))
+        # groups having interfaces in the network
+        group_ids = [link['DBRef'].id for link in self.get_back_links(collection = 'group')]
+        group_ifs = {}
+        for group_json in self._mongo_db['group'].find({'_id': {'$in': group_ids}}, {'interfaces': 1, 'bmcnetwork': 1}):
+            interfaces = group_json.get('interfaces') or {}
+            ifs = [interface for interface in interfaces
+                    if bool(interfaces[interface]['network']) and interfaces[interface]['network'].id == self.id]
+            bmcnetwork = group_json.get('bmcnetwork')
+            bmc = bool(bmcnetwork) and bmcnetwork.id == self.id
+            if bool(ifs) or bmc:
+                group_ifs[group_json['_id']] = (ifs, bmc)
+        if bool(group_ifs):
+            group_dbrefs = [DBRef('group', group_id) for group_id in group_ifs]
+            cursor = self._mongo_db['node'].find({'group': {'$in': group_dbrefs}},
+                    {'name': 1, 'group': 1, 'interfaces': 1, 'bmcnetwork': 1})
+            for node_json in cursor:
+                ifs, bmc = group_ifs[node_json['group'].id]
+                if bmc:
+                    add_to_out_dict(node_json['name'], node_json.get('bmcnetwork'))
+                for interface in ifs:
+                    try:
+                        ip = node_json['interfaces'][interface]
+                    except:
+                        ip = None
+                    add_to_out_dict(node_json['name'], ip)
+
+        for switch_json in self._mongo_db['switch'].find({'network': self.DBRef}, {'name': 1, 'ip': 1}):
+            add_to_out_dict(switch_json['name'], switch_json.get('ip'))
+
+        connected_key = 'connected.' + str(self.id)
+        for otherdev_json in self._mongo_db['otherdev'].find({connected_key: {'$exists': True}}, {'name': 1, 'connected': 1}):
+            add_to_out_dict(otherdev_json['name'], otherdev_json['connected'][str(self.id)])
+
         add_to_out_dict(obj_json['ns_hostname'], obj_json['ns_ip'])
         return out_dict
@@ -23,9 +23,15 @@ along with Luna.  If not, see <http://www.gnu.org/licenses/>.
 from config import *
 import logging
 import json
+import pymongo
+import copy
+import socket
+import struct
+import threading
+import time
 from bson.dbref import DBRef
 from bson.objectid import ObjectId
-from luna.utils import set_mac_node
+from luna.utils import set_mac_node, clear_mac_node, get_mongo_db, bump_generation, object_generation, get_generations, get_local_bumps
 from luna.base import Base
 from luna.cluster import Cluster
 from luna.network import Network
@@ -33,6 +39,31 @@ from luna.osimage import OsImage
 from luna.bmcsetup import BMCSetup
 from luna.switch import Switch
 
+# Compiled group profiles: {group_id: {'profile': {...}, 'deps': {generation: value},
+#                                     'checked': time, 'bumps': local bumps}}
+# Profile is rebuilt when generation of the group or objects it uses changes.
+# Generations are checked not often than once per interval, unless they were
+# changed by this process
+_group_profiles = {}
+_group_profiles_lock = threading.Lock()
+_group_profile_check_interval = 1
+
+def _group_dependency_generations(group_json):
+    """
+    Returns names of generation counters of the group
+    and its osimage, bmcsetup and networks
+    """
+    names = [object_generation('group', group_json['_id'])]
+    for key in ['osimage', 'bmcsetup', 'bmcnetwork']:
+        dbref = group_json.get(key)
+        if bool(dbref):
+            names.append(object_generation(dbref.collection, dbref.id))
+    for interface in (group_json.get('interfaces') or {}).values():
+        dbref = interface.get('network')
+        if bool(dbref):
+            names.append(object_generation(dbref.collection, dbref.id))
+    return names
+
 class Node(Base):
     """
     Class for operating with node records
@@ -64,11 +95,13 @@ class Node(Base):
             self._name = name
             self._id = self._mongo_collection.insert(mongo_doc)
             self._DBRef = DBRef(self._collection_name, self._id)
+            cluster.update_node_num([name])
             for interface in group._get_json()['interfaces']:
                 self.add_ip(interface)
             self.add_bmc_ip()
             self.link(group)
             self.link(cluster)
+            self._config_changed()
         else:
             self._name = mongo_doc['name']
             self._id = mongo_doc['_id']
@@ -79,21 +112,112 @@ class Node(Base):
         cluster = Cluster(mongo_db)
         prefix = cluster.get('nodeprefix')
         digits = cluster.get('nodedigits')
-        back_links = cluster.get_back_links()
-        max_num = 0
-        for link in back_links:
-            if not link['collection'] == self._collection_name:
-                continue
-            node = Node(id = link['DBRef'].id, mongo_db = mongo_db)
-            name = node.name
-            try:
-                nnode = int(name.lstrip(prefix))
-            except ValueError:
-                continue
-            if nnode > max_num:
-                max_num = nnode
-        ret_name = prefix + str(max_num + 1).zfill(digits)
-        return ret_name
+        node_collection = cluster._mongo_db[self._collection_name]
+        while True:
+            num = cluster.next_node_num(prefix)
+            if num is None:
+                return None
+            ret_name = prefix + str(num).zfill(digits)
+            # name could be taken by node created with explicit name
+            if not node_collection.find_one({'name': ret_name}, {'_id': 1}):
+                return ret_name
+
+    @classmethod
+    def bulk_create(cls, names, group, mongo_db = None,
+            localboot = False, setupbmc = True, service = False):
+        """
+        Create several nodes of the same group at once.
+        IPs are reserved with one write per network, node documents
+        and links are inserted in batches
+        """
+        logger = logging.getLogger(__name__)
+        if not mongo_db:
+            mongo_db = get_mongo_db()
+        names = [str(name) for name in names]
+        if len(set(names)) != len(names):
+            logger.error("Duplicate names in the list")
+            return None
+        if not bool(names):
+            return []
+        node_collection = mongo_db['node']
+        existing = [doc['name'] for doc in node_collection.find({'name': {'$in': names}}, {'name': 1})]
+        if bool(existing):
+            logger.error("Object(s) '{}' exist already".format(", ".join(existing)))
+            return None
+        cluster = Cluster(mongo_db = mongo_db)
+        group = Group(group, mongo_db = mongo_db)
+        group_json = group._get_json()
+        networks = {}
+        reserved = {}
+
+        def release_reserved(idx_list):
+            # one write per network
+            nums = {}
+            for key in reserved:
+                net_id, ips = reserved[key]
+                nums.setdefault(net_id, []).extend([ips[idx] for idx in idx_list])
+            for net_id in nums:
+                if bool(nums[net_id]):
+                    networks[net_id].release_ips(nums[net_id])
+
+        def reserve(key, net_dbref):
+            if not bool(net_dbref):
+                return True
+            if net_dbref.id not in networks:
+                networks[net_dbref.id] = Network(id = net_dbref.id, mongo_db = mongo_db)
+            ips = networks[net_dbref.id].reserve_block(len(names), contiguous = False)
+            if not bool(ips):
+                return False
+            reserved[key] = (net_dbref.id, ips)
+            return True
+
+        group_interfaces = group_json['interfaces'] or {}
+        for interface in group_interfaces:
+            if not reserve(interface, group_interfaces[interface]['network']):
+                logger.error("Cannot reserve IPs for interface '{}'".format(interface))
+                release_reserved(range(len(names)))
+                return None
+        if not reserve(None, group_json['bmcnetwork']):
+            logger.error("Cannot reserve IPs for bmc interface")
+            release_reserved(range(len(names)))
+            return None
+
+        mongo_docs = []
+        for idx in range(len(names)):
+            interfaces = {}
+            for interface in group_interfaces:
+                interfaces[interface] = None
+                if interface in reserved:
+                    interfaces[interface] = reserved[interface][1][idx]
+            bmcip = None
+            if None in reserved:
+                bmcip = reserved[None][1][idx]
+            mongo_docs.append({'_id': ObjectId(), 'name': names[idx], 'group': group.DBRef,
+                    'interfaces': interfaces, 'bmcnetwork': bmcip,
+                    'mac': None, 'switch': None, 'port': None,
+                    'localboot': localboot, 'setupbmc': setupbmc, 'service': service})
+        ids = [doc['_id'] for doc in mongo_docs]
+        ret = True
+        try:
+            node_collection.insert(mongo_docs)
+        except pymongo.errors.PyMongoError as exc:
+            # some documents could be inserted before the failure
+            logger.error("Error while creating nodes: {}".format(exc))
+            inserted = set([doc['_id'] for doc in node_collection.find({'_id': {'$in': ids}}, {'_id': 1})])
+            release_reserved([idx for idx in range(len(ids)) if ids[idx] not in inserted])
+            ids = [uid for uid in ids if uid in inserted]
+            ret = None
+        links = []
+        for uid in ids:
+            for remote_dbref in (group.DBRef, cluster.DBRef):
+                links.append({'src': DBRef('node', uid), 'dst': remote_dbref, 'count': 1})
+        if bool(links):
+            mongo_db[links_collection].insert(links)
+        cluster.update_node_num(names)
+        bump_generation('nodes', mongo_db)
+        if not ret:
+            return None
+        return names
 
     def change_group(self, new_group_name = None):
         if not bool(new_group_name):
@@ -126,6 +250,7 @@ class Node(Base):
         self.del_bmc_ip()
         self.unlink(old_group)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'group': new_group.DBRef}}, multi=False, upsert=False)
+        self.refresh()
         self.link(new_group)
         try:
             newbmc_net_id = new_group._get_json()['bmcnetwork'].id
@@ -148,6 +273,7 @@ class Node(Base):
                 except:
                     old_ip = None
             self.add_ip(interface, old_ip)
+        self._config_changed()
         return res['err']
 
     def change_ip(self, interface = None, reqip = None):
@@ -210,6 +336,8 @@ class Node(Base):
             self._logger.warning("Cannot reserve ip for interface '{}'.".format(interface))
         node_interfaces[interface] = ip
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': node_interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return not res['err']
 
     def del_ip(self, interface = None):
@@ -233,6 +361,8 @@ class Node(Base):
                     group._release_ip(iface, ip)
                 mongo_doc.pop(iface)
             res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': mongo_doc}}, multi=False, upsert=False)
+            self.refresh()
+            self._config_changed()
             return not res['err']
         try:
             ip = json['interfaces'][interface]
@@ -242,6 +372,8 @@ class Node(Base):
         group._release_ip(interface, ip)
         mongo_doc.pop(interface)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': mongo_doc}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return not res['err']
 
     def add_bmc_ip(self, reqip = None):
@@ -264,6 +396,8 @@ class Node(Base):
             return None
         mongo_doc = ip
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcnetwork': mongo_doc}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return not res['err']
 
     def del_bmc_ip(self):
@@ -282,17 +416,32 @@ class Node(Base):
         if bool(res):
             mongo_doc = None
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcnetwork': mongo_doc}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return not res['err']
 
-    def set_mac(self, mac = None):
+    def set_mac(self, mac = None, update_dhcp = True):
+        """
+        If update_dhcp is False, dhcpd host entries are not rewritten
+        here but marked as outdated for DhcpHostsUpdater
+        """
         import re
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
         if type(mac) == type('') and re.match('(([a-fA-F0-9]{2}:){4}([a-fA-F0-9]{2}))', mac):
             mac = mac.lower()
+            node_ids = [self._id]
+            try:
+                node_ids.append(self._mongo_db['mac'].find_one({'mac': mac}, {'node': 1})['node'].id)
+            except:
+                pass
             set_mac_node(mac, self.DBRef, (self._mongo_db))
             #res = self._mongo_collection.update({'_id': self._id}, {'$set': {'mac': mac}}, multi=False, upsert=False)
+            if update_dhcp:
+                self._update_dhcp_hosts(node_ids)
+            else:
+                bump_generation('dhcp_hosts', self._mongo_db)
             return True
         return None
 
@@ -312,17 +461,29 @@ class Node(Base):
             return None
         mac = self.get_mac()
         self._mongo_db['switch_mac'].remove({'mac': mac})
-        res = self._mongo_db['mac'].remove({'mac': mac})
+        res = clear_mac_node(mac, self._mongo_db)
+        self._update_dhcp_hosts([self._id])
         return res['ok']
 
+    def _update_dhcp_hosts(self, node_ids):
+        """
+        Updates dhcpd host entries after MAC binding was changed
+        """
+        try:
+            Cluster(mongo_db = self._mongo_db).update_dhcp_hosts(node_ids)
+        except:
+            self._logger.error("Unable to update DHCP host entries for '{}'".format(self.name))
+
     def set_switch(self, name):
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        switch = Switch(name)
+        switch = Switch(name, mongo_db = self._mongo_db)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'switch': switch.DBRef}}, multi=False, upsert=False)
+        self.refresh()
         if res['ok'] == 1:
             self.link(switch.DBRef)
+            self._config_changed()
         return bool(res['ok'])
 
     def clear_switch(self):
@@ -334,10 +495,12 @@ class Node(Base):
             switch_id = json['switch'].id
         except:
             return None
-        switch = Switch(id = switch_id)
+        switch = Switch(id = switch_id, mongo_db = self._mongo_db)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'switch': None}}, multi=False, upsert=False)
+        self.refresh()
         if res['ok'] == 1:
             self.unlink(switch.DBRef)
+            self._config_changed()
         return bool(res['ok'])
  
     def set_port(self, num):
@@ -355,21 +518,22 @@ class Node(Base):
             self._logger.error("Was object deleted?")
             return None
         mac = self.get_mac()
-        back_links = self.get_back_links(resolve=True)
+        back_links = self.get_back_links()
         if len(back_links) > 0:
-            #back_links = self.get_back_links(resolve=True)
+            back_links = self._format_links([elem['DBRef'] for elem in back_links], resolve=True)
             self._logger.error("Current object is being written as a dependency for the following objects:")
             for elem in back_links:
-                self._logger.error(json.dumps(elem, sort_keys=True ))
+                self._logger.error("[{}/{}]".format(elem['collection'], elem['name']))
             return None
-        links = self.get_links(resolve=True)
+        links = self.get_links()
         for link in links:
             self.unlink(link['DBRef'])
         self._mongo_db['switch_mac'].remove({'mac': mac})
-        self._mongo_db['mac'].remove({'mac': mac})
+        clear_mac_node(mac, self._mongo_db)
         self.del_bmc_ip()
         self.del_ip()
         ret = self._mongo_collection.remove({'_id': self._id}, multi=False)
+        self._config_changed()
         self._wipe_vars()
         return not ret['err']
 
@@ -433,6 +597,67 @@ class Node(Base):
         return 'luna.ip=enp0s3:10.141.0.1:16' # luna.ip=dhcp
     """
 
+    def _config_changed(self):
+        bump_generation('nodes', self._mongo_db)
+        if self._id:
+            bump_generation(object_generation(self._collection_name, self._id), self._mongo_db)
+
+    def dependency_generations(self):
+        """
+        Returns names of generation counters of the objects boot and
+        install parameters of the node depend on: node itself,
+        its group, osimage, bmcsetup and networks
+        """
+        json = self._get_json()
+        group_json = self._mongo_db['group'].find_one({'_id': json['group'].id},
+            {'osimage': 1, 'bmcsetup': 1, 'bmcnetwork': 1, 'interfaces': 1})
+        names = [object_generation(self._collection_name, self._id)]
+        names.extend(_group_dependency_generations(group_json))
+        return names
+
+    def _get_group_profile(self):
+        """
+        Returns compiled profile of the node's group from the cache
+        """
+        group_id = self._get_json()['group'].id
+        now = time.time()
+        bumps = get_local_bumps()
+        with _group_profiles_lock:
+            entry = _group_profiles.get(group_id)
+            if (entry is not None and entry['bumps'] == bumps
+                    and now - entry['checked'] < _group_profile_check_interval):
+                return entry['profile']
+        if entry is not None:
+            current = get_generations(entry['deps'].keys(), self._mongo_db)
+            if all([current[name][0] == entry['deps'][name] for name in entry['deps']]):
+                with _group_profiles_lock:
+                    entry['checked'] = now
+                    entry['bumps'] = bumps
+                return entry['profile']
+        group = Group(id = group_id, mongo_db = self._mongo_db)
+        # generations are read before compiling, so changes made meanwhile are not missed
+        names = _group_dependency_generations(group._get_json())
+        deps = dict([(name, value) for name, (value, updated) in get_generations(names, self._mongo_db).items()])
+        profile = group.compile_profile()
+        with _group_profiles_lock:
+            _group_profiles[group_id] = {'profile': profile, 'deps': deps, 'checked': now, 'bumps': bumps}
+        return profile
+
+    def _get_profile_ip(self, profile, interface):
+        json = self._get_json()
+        try:
+            if interface is None:
+                ipnum = json['bmcnetwork']
+                net_num = profile['bmcnetwork']
+            else:
+                ipnum = json['interfaces'][interface]
+                net_num = profile['networks'][interface]
+        except:
+            return None
+        if not bool(ipnum) or net_num is None:
+            return None
+        return socket.inet_ntoa(struct.pack('>L', net_num + ipnum))
+
     @property
     def boot_params(self):
         """
@@ -440,8 +665,8 @@ class Node(Base):
         kernel, initrd, kernel opts, ip, net, prefix
         """
         params = {}
-        group = Group(id = self.get('group').id, mongo_db = self._mongo_db)
-        group_params = group.boot_params()
+        profile = self._get_group_profile()
+        group_params = profile['boot']
         params['boot_if'] = group_params['boot_if']
         params['kernel_file'] = group_params['kernel_file']
         params['initrd_file'] = group_params['initrd_file']
@@ -449,7 +674,7 @@ class Node(Base):
         params['boot_if'] = group_params['boot_if']
         params['net_prefix'] = group_params['net_prefix']
         if (params['boot_if']):
-            params['ip'] = self.get_human_ip(params['boot_if'])
+            params['ip'] = self._get_profile_ip(profile, params['boot_if'])
         params['name'] = self.name
         params['service'] = int(self.get('service'))
         params['localboot'] = self.get('localboot')
@@ -457,20 +682,16 @@ class Node(Base):
 
     @property
     def install_params(self):
-        params = {}
-        group = Group(id = self.get('group').id, mongo_db = self._mongo_db)
-        params = group.install_params
+        profile = self._get_group_profile()
+        params = copy.deepcopy(profile['install'])
         if bool(params['torrent_if']):
-            params['torrent_if_ip'] = self.get_human_ip(params['torrent_if'])
+            params['torrent_if_ip'] = self._get_profile_ip(profile, params['torrent_if'])
         for interface in params['interfaces']:
-            if bool(self.get_human_ip(interface)):
-                params['interfaces'][interface] = params['interfaces'][interface].strip() + "\n" + "IPADDR=" + self.get_human_ip(interface)
+            ip = self._get_profile_ip(profile, interface)
+            if bool(ip):
+                params['interfaces'][interface] = params['interfaces'][interface].strip() + "\n" + "IPADDR=" + ip
         if params['bmcsetup']:
-            try:
-                ip = self.get_human_bmc_ip()
-                params['bmcsetup']['ip'] = ip
-            except:
-                pass
+            params['bmcsetup']['ip'] = self._get_profile_ip(profile, None)
         params['name'] = self.name
         if params['domain']:
             params['hostname'] = self.name + "." +  params['domain']
@@ -504,10 +725,10 @@ class Group(Base):
             cluster = Cluster(mongo_db = self._mongo_db)
             (bmcobj, bmcnetobj) = (None, None)
             if bool(bmcsetup):
-                bmcobj = BMCSetup(bmcsetup).DBRef
+                bmcobj = BMCSetup(bmcsetup, mongo_db = self._mongo_db).DBRef
             if bool(bmcnetwork):
                 bmcnetobj = Network(bmcnetwork, mongo_db = self._mongo_db).DBRef
-            osimageobj = OsImage(osimage)
+            osimageobj = OsImage(osimage, mongo_db = self._mongo_db)
             if bool(interfaces) and type(interfaces) is not type([]):
                 self._logger.error("'interfaces' should be list")
                 raise RuntimeError
@@ -547,10 +768,12 @@ EOF"""
         if not self._id:
             self._logger.error("Was object deleted?")
             return None
-        osimage = OsImage(osimage_name)
+        osimage = OsImage(osimage_name, mongo_db = self._mongo_db)
         old_dbref = self._get_json()['osimage']
         self.unlink(old_dbref)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'osimage': osimage.DBRef}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         self.link(osimage.DBRef)
         return not res['err']
 
@@ -560,31 +783,32 @@ EOF"""
             return None
         bmcsetup = None
         if bool(bmcsetup_name):
-            bmcsetup = BMCSetup(bmcsetup_name)
+            bmcsetup = BMCSetup(bmcsetup_name, mongo_db = self._mongo_db)
         old_dbref = self._get_json()['bmcsetup']
         if bool(old_dbref):
             self.unlink(old_dbref)
         if bool(bmcsetup):
             res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcsetup': bmcsetup.DBRef}}, multi=False, upsert=False)
+            self.refresh()
+            self._config_changed()
             self.link(bmcsetup.DBRef)
         else:
             res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcsetup': None}}, multi=False, upsert=False)
+            self.refresh()
+            self._config_changed()
         return not res['err']
 
     def set_bmcnetwork(self, bmcnet):
         old_bmcnet_dbref = self._get_json()['bmcnetwork']
         net = Network(bmcnet, mongo_db = self._mongo_db)
-        reverse_links = self.get_back_links()
         if bool(old_bmcnet_dbref):
             self._logger.error("Network is already defined for BMC interface")
             return None
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcnetwork': net.DBRef}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         self.link(net.DBRef)
-        for link in reverse_links:
-            if link['collection'] != 'node':
-                continue
-            node = Node(id=link['DBRef'].id, mongo_db = self._mongo_db)
-            node.add_bmc_ip()
+        self._reserve_nodes_ips(net)
         return not res['err']
 
     def del_bmcnetwork(self):
@@ -598,6 +822,8 @@ EOF"""
                 node.del_bmc_ip()
             self.unlink(old_bmcnet_dbref)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'bmcnetwork': None}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         return not res['err']
 
     
@@ -656,6 +882,8 @@ EOF"""
             return None
         interfaces[interface] = {'network': None, 'params': ''}
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         if res['err']:
             self._logger.error("Error adding interface '{}'".format(interface))
             return None
@@ -694,35 +922,26 @@ EOF"""
             except:
                 rel_ips[key] = val
                 
-        json = self._get_json()
         if_dict = self.list_interfaces()
         bmcif =  if_dict['bmcnetwork']
         ifs = if_dict['interfaces']
-        if bool(bmcif):
-            if bmcif.id == netobjid:
+        bmc = bool(bmcif) and bmcif.id == netobjid
+        net_ifs = []
+        if bool(ifs):
+            net_ifs = [interface for interface in ifs
+                    if bool(ifs[interface]['network']) and ifs[interface]['network'].id == netobjid]
+        if not bmc and not bool(net_ifs):
+            return rel_ips
+        cursor = self._mongo_db['node'].find({'group': self.DBRef}, {'name': 1, 'interfaces': 1, 'bmcnetwork': 1})
+        for node_json in cursor:
+            if bmc:
+                add_to_dict(node_json['name'], node_json.get('bmcnetwork'))
+            for interface in net_ifs:
                 try:
-                    node_links = json[usedby_key]
-                except KeyError:
-                    node_links = None
-                if bool(node_links):
-                    for node_id in node_links['node']:
-                        node = Node(id = ObjectId(node_id))
-                        add_to_dict(node.name, node.get_rel_bmc_ip())
-
-        if bool(if_dict):
-            for interface in ifs:
-                if not bool(ifs[interface]['network']):
-                    continue
-                if ifs[interface]['network'].id == netobjid:
-                    try:
-                        node_links = json[usedby_key]
-                    except KeyError:
-                        node_links = None
-                    if not bool(node_links):
-                        continue
-                    for node_id in node_links['node']:
-                        node = Node(id = ObjectId(node_id))
-                        add_to_dict(node.name, node.get_rel_ip(interface))
+                    ip = node_json['interfaces'][interface]
+                except:
+                    ip = None
+                add_to_dict(node_json['name'], ip)
         return rel_ips
                         
 
@@ -738,6 +957,8 @@ EOF"""
             return None
         interfaces[interface]['params'] = parms
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         if res['err']:
             self._logger.error("Error setting network parameters for interface '{}'".format(interface))
             return None
@@ -764,18 +985,203 @@ EOF"""
             return None
         interfaces[interface]['network'] = net.DBRef
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         if res['err']:
             self._logger.error("Error adding network for interface '{}'".format(interface))
             return None
         self.link(net.DBRef)
-        reverse_links = self.get_back_links()
-        for link in reverse_links:
-            if link['collection'] != 'node':
-                continue
-            node = Node(id=link['DBRef'].id, mongo_db = self._mongo_db)
-            node.add_ip(interface)
+        self._reserve_nodes_ips(net, interface)
+        return True
+
+    def _reserve_nodes_ips(self, net, interface = None):
+        """
+        Assign IPs on 'interface' (BMC if None) to the nodes of the group
+        which do not have them. IPs are reserved with one call and nodes
+        are updated in one bulk operation
+        """
+        cursor = self._mongo_db['node'].find({'group': self.DBRef},
+                {'interfaces': 1, 'bmcnetwork': 1}).sort('name', pymongo.ASCENDING)
+        nodes = []
+        for node_json in cursor:
+            if interface is None:
+                old_ip = node_json.get('bmcnetwork')
+            else:
+                old_ip = (node_json.get('interfaces') or {}).get(interface)
+            if not bool(old_ip):
+                nodes.append(node_json)
+        if not bool(nodes):
+            return True
+        ips = net.reserve_block(len(nodes), contiguous = False)
+        if not bool(ips):
+            self._logger.error("Cannot reserve IPs for nodes in network '{}'".format(net.name))
+            return None
+        bulk = self._mongo_db['node'].initialize_unordered_bulk_op()
+        for node_json, ip in zip(nodes, ips):
+            if interface is None:
+                mongo_doc = {'bmcnetwork': ip}
+            else:
+                node_interfaces = node_json.get('interfaces') or {}
+                node_interfaces[interface] = ip
+                mongo_doc = {'interfaces': node_interfaces}
+            bulk.find({'_id': node_json['_id']}).update({'$set': mongo_doc})
+        bulk.execute()
+        bump_generation('nodes', self._mongo_db)
         return True
 
+    def renumber(self, interface = None, network = None, bmc = False, dry_run = False):
+        """
+        Move IPs of all nodes of the group on 'interface' (or on BMC
+        network if bmc is True) to 'network', or renumber them in the
+        current one if network is not specified. New IPs are given in
+        the order of node names.
+        Move to other network is recorded in 'renumber' field of the
+        group before nodes are touched, so interrupted move is resumed
+        on the next call.
+        Returns list of {'name', 'interface', 'bmc', 'old', 'new'}
+        """
+        if not self._id:
+            self._logger.error("Was object deleted?")
+            return None
+        if bool(bmc) == bool(interface):
+            self._logger.error("Either interface or BMC should be specified")
+            return None
+        json = self._get_json(fresh = True)
+        if bmc:
+            if_key = None
+            cur_dbref = json['bmcnetwork']
+        else:
+            if_key = interface
+            try:
+                cur_dbref = json['interfaces'][interface]['network']
+            except:
+                self._logger.error("Interface '{}' does not exist".format(interface))
+                return None
+        if_name = if_key or 'BMC'
+        pending = json.get('renumber')
+        if bool(pending):
+            if pending['interface'] != if_key:
+                self._logger.error("Move of '{}' to other network was interrupted. Finish it first".format(pending['interface'] or 'BMC'))
+                return None
+            if dry_run:
+                self._logger.error("Move of '{}' to other network was interrupted. Run without dry run to finish it".format(if_name))
+                return None
+            new_net = Network(id = cur_dbref.id, mongo_db = self._mongo_db)
+            if bool(network) and network != new_net.name:
+                self._logger.error("Move of '{}' to network '{}' was interrupted. Finish it first".format(if_name, new_net.name))
+                return None
+            old_net = None
+            if bool(pending['network']):
+                old_net = Network(id = pending['network'].id, mongo_db = self._mongo_db)
+            self._logger.info("Resuming move of '{}' to network '{}'".format(if_name, new_net.name))
+        else:
+            old_net = None
+            if bool(cur_dbref):
+                old_net = Network(id = cur_dbref.id, mongo_db = self._mongo_db)
+            if bool(network):
+                new_net = Network(network, mongo_db = self._mongo_db)
+            elif bool(old_net):
+                new_net = old_net
+            else:
+                self._logger.error("Network is not configured for '{}'".format(if_name))
+                return None
+        same_net = bool(old_net) and old_net.id == new_net.id
+        cursor = self._mongo_db['node'].find({'group': self.DBRef},
+                {'name': 1, 'interfaces': 1, 'bmcnetwork': 1}).sort('name', pymongo.ASCENDING)
+        entries = []
+        release = []
+        for node_json in cursor:
+            if if_key is None:
+                old_ip = node_json.get('bmcnetwork')
+            else:
+                old_ip = (node_json.get('interfaces') or {}).get(if_key)
+            if bool(old_ip) and bool(old_net):
+                release.append(old_ip)
+            entries.append((node_json, if_key))
+        if dry_run or same_net:
+            diff = new_net.renumber_nodes(entries, release if same_net else None, dry_run)
+        else:
+            diff = self._move_nodes(if_key, entries, release, old_net, new_net, pending)
+        if diff is None:
+            return None
+        for elem in diff:
+            if bool(pending):
+                # old IPs are not known on resume
+                elem['old'] = None
+            elif bool(elem['old']) and bool(old_net):
+                elem['old'] = old_net.relnum_to_ip(elem['old'])
+            elem['new'] = new_net.relnum_to_ip(elem['new'])
+        return diff
+
+    def _move_nodes(self, if_key, entries, release, old_net, new_net, pending = None):
+        """
+        Steps of moving nodes to other network. The move is recorded in
+        'renumber' field of the group first, changes of the lists of free
+        IPs are tagged with its id, so on resume every step is done once
+        """
+        if if_key is None:
+            net_key = 'bmcnetwork'
+        else:
+            net_key = 'interfaces.' + if_key + '.network'
+        if not bool(pending):
+            old_dbref = None
+            if bool(old_net):
+                old_dbref = old_net.DBRef
+            pending = {'id': str(ObjectId()), 'interface': if_key, 'network': old_dbref,
+                    'release': release, 'nodes': [node_json['_id'] for node_json, interface in entries]}
+            res = self._mongo_collection.update({'_id': self._id, 'renumber': {'$exists': False}},
+                    {'$set': {net_key: new_net.DBRef, 'renumber': pending}}, multi=False, upsert=False)
+            if res['err'] or not res['n']:
+                self._logger.error("Cannot start move to network '{}'".format(new_net.name))
+                return None
+            self._config_changed()
+        # nodes could be deleted meanwhile, new nodes got IPs from new network already
+        existing = dict([(node_json['_id'], node_json) for node_json, interface in entries])
+        entries = [(existing[node_id], if_key) for node_id in pending['nodes'] if node_id in existing]
+        tag = pending['id']
+        ips = []
+        if bool(pending['nodes']):
+            ips = new_net.reserve_block(len(pending['nodes']), contiguous = False, tag = tag + '-reserve')
+            if not bool(ips):
+                # nothing was reserved, so nodes were not touched
+                self._rollback_move(old_net, net_key)
+                return None
+        ips = dict(zip(pending['nodes'], ips))
+        diff = new_net.renumber_nodes(entries, ips = [ips[node_json['_id']] for node_json, interface in entries])
+        if diff is None:
+            return None
+        if not pending.get('linked'):
+            if bool(old_net):
+                self.unlink(old_net.DBRef)
+            self.link(new_net.DBRef)
+            self._mongo_collection.update({'_id': self._id}, {'$set': {'renumber.linked': True}})
+        unused = [ips[node_id] for node_id in pending['nodes'] if node_id not in existing]
+        if bool(unused):
+            new_net.release_ips(unused, tag = tag + '-unused')
+        if bool(old_net) and bool(pending['release']):
+            old_net.release_ips(pending['release'], tag = tag + '-release')
+        res = self._mongo_collection.update({'_id': self._id}, {'$unset': {'renumber': ''}})
+        self.refresh()
+        if res['err']:
+            self._logger.error("Error finishing move to network '{}'".format(new_net.name))
+            return None
+        new_net.forget_free_list_changes([tag + '-reserve', tag + '-unused'])
+        if bool(old_net):
+            old_net.forget_free_list_changes([tag + '-release'])
+        return diff
+
+    def _rollback_move(self, old_net, net_key):
+        """
+        Return network reference back if no IPs were reserved
+        """
+        old_dbref = None
+        if bool(old_net):
+            old_dbref = old_net.DBRef
+        self._mongo_collection.update({'_id': self._id},
+                {'$set': {net_key: old_dbref}, '$unset': {'renumber': ''}})
+        self.refresh()
+        self._config_changed()
+
     def del_net_from_if(self, interface):
         if not self._id:
             self._logger.error("Was object deleted?")
@@ -805,6 +1211,8 @@ EOF"""
         self.unlink(net_dbref)
         interfaces[interface]['network'] = None
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         if res['err']:
             self._logger.error("Error adding network for interface '{}'".format(interface))
             return None
@@ -818,6 +1226,8 @@ EOF"""
         interfaces = self._get_json()['interfaces']
         interfaces.pop(interface)
         res = self._mongo_collection.update({'_id': self._id}, {'$set': {'interfaces': interfaces}}, multi=False, upsert=False)
+        self.refresh()
+        self._config_changed()
         if res['err']:
             self._logger.error("Error deleting interface '{}'".format(interface))
             return None
@@ -937,6 +1347,29 @@ EOF"""
         net = Network(id = dbref.id, mongo_db = self._mongo_db)
         return net.ip_to_relnum(ip)
 
+    def compile_profile(self):
+        """
+        Group-level data needed to build boot and install parameters
+        for the nodes: boot and install params plus numeric network
+        addresses to compute nodes' IPs without reading networks
+        """
+        json = self._get_json()
+        profile = {'networks': {}, 'bmcnetwork': None}
+        interfaces = json['interfaces'] or {}
+        for interface in interfaces:
+            profile['networks'][interface] = None
+            net_dbref = interfaces[interface]['network']
+            if not bool(net_dbref):
+                continue
+            net = Network(id = net_dbref.id, mongo_db = self._mongo_db)
+            profile['networks'][interface] = net._get_json()['NETWORK']
+        if bool(json['bmcnetwork']):
+            net = Network(id = json['bmcnetwork'].id, mongo_db = self._mongo_db)
+            profile['bmcnetwork'] = net._get_json()['NETWORK']
+        profile['boot'] = self.boot_params()
+        profile['install'] = self.install_params
+        return profile
+
     def boot_params(self):
         params = {}
         params['boot_if'] = None
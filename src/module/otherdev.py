@@ -113,6 +113,7 @@ class OtherDev(Base):
         net.release_ip(net.relnum_to_ip(rel_ip))
         obj_json['connected'].pop(str(net.id))
         ret = self._mongo_collection.update({'_id': self._id}, {'$set': obj_json}, multi=False, upsert=False)
+        self.refresh()
         self.unlink(net)
         return not ret['err']
 
@@ -142,6 +143,7 @@ class OtherDev(Base):
             return None
         obj_json['connected'][str(net.DBRef.id)] = new_ip
         ret = self._mongo_collection.update({'_id': self._id}, {'$set': obj_json}, multi=False, upsert=False)
+        self.refresh()
         if not old_rel_ip:
             self.link(net)
 
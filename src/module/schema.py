@@ -0,0 +1,111 @@
+'''
+Written by Dmitry Chirikov <dmitry@chirikov.ru>
+This file is part of Luna, cluster provisioning tool
+https://github.com/dchirikov/luna
+
+This file is part of Luna.
+
+Luna is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Luna is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Luna.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+from config import *
+import logging
+import pymongo
+
+# Indexes used by the hot paths. Format is
+# {collection: [(keys, options), ...]}, where keys is the list of (field, direction)
+_named_collections = ['cluster', 'osimage', 'bmcsetup', 'group', 'node',
+                      'network', 'switch', 'otherdev']
+
+indexes = {}
+for _collection in _named_collections:
+    indexes[_collection] = [([('name', pymongo.ASCENDING)], {'unique': True})]
+
+indexes['node'].extend([
+    ([('switch', pymongo.ASCENDING), ('port', pymongo.ASCENDING)], {}),
+    ([('group', pymongo.ASCENDING)], {}),
+])
+indexes['mac'] = [
+    ([('mac', pymongo.ASCENDING)], {'unique': True}),
+    ([('node', pymongo.ASCENDING)], {}),
+    # plain index, MacIndex polls changes by 'updated'
+    ([('updated', pymongo.ASCENDING)], {}),
+]
+indexes['switch_mac'] = [
+    ([('mac', pymongo.ASCENDING)], {}),
+    ([('switch_id', pymongo.ASCENDING), ('port', pymongo.ASCENDING)], {}),
+    ([('switch_id', pymongo.ASCENDING), ('portname', pymongo.ASCENDING)], {}),
+    # TTL index on 'updated' is not declared here: MacUpdater (luna/switch.py)
+    # creates it with expireAfterSeconds derived from its polling interval
+]
+indexes['tracker'] = [
+    ([('info_hash', pymongo.ASCENDING), ('updated', pymongo.ASCENDING)], {}),
+    ([('info_hash', pymongo.ASCENDING), ('peer_id', pymongo.ASCENDING), ('port', pymongo.ASCENDING)], {}),
+    ([('info_hash', pymongo.ASCENDING), ('ip', pymongo.ASCENDING), ('port', pymongo.ASCENDING)], {}),
+    ([('updated', pymongo.ASCENDING)], {'expireAfterSeconds': 3600}),
+]
+indexes[links_collection] = [
+    ([('src', pymongo.ASCENDING)], {}),
+    ([('dst', pymongo.ASCENDING)], {}),
+    ([('src', pymongo.ASCENDING), ('dst', pymongo.ASCENDING)], {'unique': True}),
+]
+
+def ensure_indexes(mongo_db = None, collections = None):
+    """
+    Create indexes declared above. Returns False if some of them
+    could not be created, e.g. because of duplicate names or MACs
+    """
+    from luna.utils import get_mongo_db
+    logger = logging.getLogger(__name__)
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    if not collections:
+        collections = indexes.keys()
+    ret = True
+    for collection in collections:
+        for keys, options in indexes[collection]:
+            try:
+                mongo_db[collection].create_index(keys, **options)
+            except pymongo.errors.DuplicateKeyError:
+                logger.error("Unable to create unique index {} for '{}': duplicate values exist".format(keys, collection))
+                ret = False
+            except pymongo.errors.OperationFailure as exc:
+                logger.error("Unable to create index {} for '{}': {}".format(keys, collection, exc))
+                ret = False
+    return ret
+
+def check_indexes(mongo_db = None):
+    """
+    Returns the list of (collection, keys, options) for declared indexes
+    missing in the database
+    """
+    from luna.utils import get_mongo_db
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    missing = []
+    for collection in indexes:
+        existing = mongo_db[collection].index_information().values()
+        for keys, options in indexes[collection]:
+            found = False
+            for index in existing:
+                if [tuple(elem) for elem in index['key']] != keys:
+                    continue
+                if bool(index.get('unique')) != bool(options.get('unique')):
+                    continue
+                found = True
+                break
+            if not found:
+                missing.append((collection, keys, options))
+    return missing
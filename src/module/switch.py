@@ -123,6 +123,7 @@ class Switch(Base):
             ip = net.reserve_ip(value)
             obj_json['ip'] = ip
             ret = self._mongo_collection.update({'_id': self._id}, {'$set': obj_json}, multi=False, upsert=False)
+            self.refresh()
             return not ret['err']
         if key == 'network':
             old_net_dbref = obj_json['network']
@@ -139,6 +140,7 @@ class Switch(Base):
             old_net.release_ip(old_ip_human_readable)
             obj_json['network'] = new_net.DBRef
             ret = self._mongo_collection.update({'_id': self._id}, {'$set': obj_json}, multi=False, upsert=False)
+            self.refresh()
             self.link(new_net)
             self.unlink(old_net)
             return not ret['err']
@@ -175,6 +177,7 @@ class MacUpdater(object):
         cluster = Cluster(mongo_db = self._mongo_db)
         while self.active:
             if counter >= self.interval:
+                cluster.refresh()
                 if cluster.is_active():
                     self.update()
                 else:
@@ -192,7 +195,7 @@ class MacUpdater(object):
         switches = self.switch_collection.find()
         mac_count = 0
         for switch in switches:
-            obj_switch = Switch(id = switch['_id'])
+            obj_switch = Switch(id = switch['_id'], mongo_db = self._mongo_db)
             oid = obj_switch.get('oid')
             ip = obj_switch.get('ip')
             read = obj_switch.get('read')
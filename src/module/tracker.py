@@ -45,6 +45,7 @@ import tornado.gen
 
 from libtorrent import bencode
 import luna
+from luna.utils import get_executor
 
 #db_name = 'luna'
 
@@ -64,8 +65,6 @@ class BaseHandler(tornado.web.RequestHandler):
 class AnnounceHandler(BaseHandler):
     """Track the torrents. Respond with the peer-list.
     """
-    @tornado.web.asynchronous
-    @tornado.gen.engine
     def update_peers(self, info_hash, peer_id, ip, port, status, uploaded, downloaded, left):
         """Store the information about the peer.
         """
@@ -77,8 +76,6 @@ class AnnounceHandler(BaseHandler):
             json.pop('status')
         self.mongo_db['tracker'].find_and_modify({'info_hash': info_hash, 'ip': ip, 'port': port}, {'$set': json}, upsert = True)
 
-    @tornado.web.asynchronous
-    @tornado.gen.engine
     def get_peers(self, info_hash, numwant, compact, no_peer_id, age):
         time_age = datetime.datetime.utcnow() - datetime.timedelta(seconds = age)
         # '6c756e616c756e616c756e616c756e616c756e61'
@@ -124,17 +121,12 @@ class AnnounceHandler(BaseHandler):
             p = {}
             p['peer_id'], p['ip'], p['port'] = peer_info
             peers.append(p)
-        self.response['complete'] = n_seeders
-        self.response['incomplete'] = n_leechers
         if compact:
             logging.debug('compact peer list: %r' % compact_peers)
             peers = compact_peers
-            self.response['peers'] = compact_peers
         else:
             logging.debug('peer list: %r' % peers)
-            self.response['peers'] = peers
-        #return (n_seeders, n_leechers, peers)
-        #self.write(bencode(self.response))
+        return (n_seeders, n_leechers, peers)
 
 
 
@@ -171,8 +163,7 @@ class AnnounceHandler(BaseHandler):
         self.luna_tracker_maxpeers = params['luna_tracker_maxpeers']
         self.mongo_db = params['mongo_db']
 
-    @tornado.web.asynchronous
-    ###@tornado.gen.engine
+    @tornado.gen.coroutine
     def get(self):
         failure_reason = ''
         warning_message = ''
@@ -258,7 +249,9 @@ class AnnounceHandler(BaseHandler):
         except:
             tracker_id = ''
  
-        self.update_peers(info_hash, peer_id, ip, port, event, uploaded, downloaded, left)
+        # pymongo calls are blocking, so run them out of IOLoop
+        executor = get_executor()
+        yield executor.submit(self.update_peers, info_hash, peer_id, ip, port, event, uploaded, downloaded, left)
 
         # generate response
         self.response = {}
@@ -276,14 +269,15 @@ class AnnounceHandler(BaseHandler):
 
         self.set_header('Content-Type', 'text/plain')
 
-        self.get_peers(info_hash,
+        res_complete, res_incomplete, res_peers = yield executor.submit(self.get_peers,
+                            info_hash,
                             numwant,
                             compact,
                             no_peer_id,
                             self.luna_tracker_interval * 2)
-        #self.response['complete'] = res_complete
-        #self.response['incomplete'] = res_incomplete
-        #self.response['peers'] = res_peers
+        self.response['complete'] = res_complete
+        self.response['incomplete'] = res_incomplete
+        self.response['peers'] = res_peers
         self.write(bencode(self.response))
         self.finish()
 
@@ -291,8 +285,7 @@ class AnnounceHandler(BaseHandler):
 class ScrapeHandler(AnnounceHandler):
     """Returns the state of all torrents this tracker is managing.
     """
-    @tornado.web.asynchronous
-    @tornado.gen.engine
+    @tornado.gen.coroutine
     def get(self):
         info_hashes = self.get_arguments('info_hash')
         response = {}
@@ -303,7 +296,8 @@ class ScrapeHandler(AnnounceHandler):
             compact = True
             no_peer_id = 1
 
-            res_complete, res_incomplete, _ = self.get_peers(info_hash, numwant, compact, no_peer_id, self.luna_tracker_interval * 2)
+            res_complete, res_incomplete, _ = yield get_executor().submit(self.get_peers,
+                info_hash, numwant, compact, no_peer_id, self.luna_tracker_interval * 2)
             response[info_hash]['complete'] = res_complete
             response[info_hash]['downloaded'] = res_complete
             response[info_hash]['incomplete'] = res_incomplete
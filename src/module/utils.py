@@ -29,23 +29,160 @@ import sys
 import os
 import errno 
 import subprocess
+import threading
+import datetime
 
-def set_mac_node(mac, node, mongo_db = None):
+_mongo_clients = {}
+_mongo_clients_lock = threading.Lock()
+
+def get_mongo_client():
+    """
+    Returns MongoClient shared by the whole process.
+    Client is created on first use and re-created after fork,
+    as pymongo's connection pool should not be inherited by child.
+    """
+    pid = os.getpid()
+    try:
+        return _mongo_clients[pid]
+    except KeyError:
+        pass
     logging.basicConfig(level=logging.INFO)
-#    logging.basicConfig(level=logging.DEBUG)
     logger = logging.getLogger(__name__)
-    if not mongo_db:
+    with _mongo_clients_lock:
+        if pid in _mongo_clients:
+            return _mongo_clients[pid]
+        # drop clients inherited from parent process
+        _mongo_clients.clear()
         try:
             mongo_client = pymongo.MongoClient(get_con_options())
         except:
             logger.error("Unable to connect to MongoDB.")
             raise RuntimeError
         logger.debug("Connection to MongoDB was successful.")
-        mongo_db = mongo_client[db_name]
+        _mongo_clients[pid] = mongo_client
+    return mongo_client
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor():
+    """
+    Returns bounded thread pool for blocking calls in lweb handlers.
+    As with MongoClient, pool is created per process.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    pid = os.getpid()
+    with _executors_lock:
+        if pid not in _executors:
+            _executors.clear()
+            _executors[pid] = ThreadPoolExecutor(max_workers = lweb_max_workers)
+        return _executors[pid]
+
+def get_mongo_db():
+    """
+    Returns luna's database from shared MongoClient
+    """
+    return get_mongo_client()[db_name]
+
+def set_mac_node(mac, node, mongo_db = None):
+    """
+    Binds mac to node. Previous bindings are not removed but
+    marked with node = None, so lweb can pick up changes incrementally
+    using 'updated' field. Such records are purged by MacIndex later
+    """
+    if not mongo_db:
+        mongo_db = get_mongo_db()
     mongo_collection = mongo_db['mac']
-    mongo_collection.remove({'mac': mac})
-    mongo_collection.remove({'node': node})
-    mongo_collection.insert({'mac': mac, 'node': node})
+    updated = datetime.datetime.utcnow()
+    mongo_collection.update({'node': node, 'mac': {'$ne': mac}},
+        {'$set': {'node': None, 'updated': updated}}, multi=True, upsert=False)
+    mongo_collection.update({'mac': mac},
+        {'$set': {'node': node, 'updated': updated}}, multi=False, upsert=True)
+
+def clear_mac_node(mac, mongo_db = None):
+    """
+    Removes binding of the mac. See set_mac_node
+    """
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    return mongo_db['mac'].update({'mac': mac, 'node': {'$ne': None}},
+        {'$set': {'node': None, 'updated': datetime.datetime.utcnow()}}, multi=False, upsert=False)
+
+def migrate_links(mongo_db = None):
+    """
+    Move links stored in '_use_'/'_usedby_' maps of the documents
+    to the separate collection. Does nothing if already converted.
+    """
+    from bson.dbref import DBRef
+    from bson.objectid import ObjectId
+    from luna.schema import ensure_indexes
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    # every object links to cluster, so its map is removed last
+    if not mongo_db['cluster'].find_one({usedby_key: {'$exists': True}}, {'_id': 1}):
+        return False
+    logger = logging.getLogger(__name__)
+    logger.info("Converting links to '{}' collection".format(links_collection))
+    ensure_indexes(mongo_db, [links_collection])
+    collections = [c for c in mongo_db.collection_names() if not c.startswith('system.') and c != 'cluster']
+    collections.append('cluster')
+    for collection in collections:
+        for doc in mongo_db[collection].find({use_key: {'$exists': True}}, {use_key: 1}):
+            src = DBRef(collection, doc['_id'])
+            for dst_collection in doc[use_key]:
+                for dst_id in doc[use_key][dst_collection]:
+                    dst = DBRef(dst_collection, ObjectId(dst_id))
+                    count = doc[use_key][dst_collection][dst_id]
+                    mongo_db[links_collection].update({'src': src, 'dst': dst}, {'$set': {'count': count}}, upsert = True)
+        query = {'$or': [{use_key: {'$exists': True}}, {usedby_key: {'$exists': True}}]}
+        mongo_db[collection].update(query, {'$unset': {use_key: 1, usedby_key: 1}}, multi = True)
+    return True
+
+# number of counters bumped by this process
+_local_bumps = {'count': 0}
+
+def bump_generation(name, mongo_db = None):
+    """
+    Increase generation counter. Counters are used by long-living
+    processes to find out if cached data is outdated
+    """
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    mongo_db['generation'].update({'_id': name},
+        {'$inc': {'value': 1}, '$set': {'updated': datetime.datetime.utcnow()}}, upsert = True)
+    _local_bumps['count'] += 1
+
+def get_local_bumps():
+    """
+    Returns number of counters bumped by this process, so caches
+    which check counters periodically could see own changes at once
+    """
+    return _local_bumps['count']
+
+def get_generation(name, mongo_db = None):
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    doc = mongo_db['generation'].find_one({'_id': name}, {'value': 1})
+    if not doc:
+        return 0
+    return doc['value']
+
+def object_generation(collection, object_id):
+    """
+    Returns name of the generation counter of the single object
+    """
+    return '{}:{}'.format(collection, object_id)
+
+def get_generations(names, mongo_db = None):
+    """
+    Returns {name: (value, updated)} for several counters at once
+    """
+    if not mongo_db:
+        mongo_db = get_mongo_db()
+    ret = dict([(name, (0, None)) for name in names])
+    for doc in mongo_db['generation'].find({'_id': {'$in': list(names)}}):
+        ret[doc['_id']] = (doc['value'], doc.get('updated'))
+    return ret
 
 def get_con_options():
     conf = ConfigParser.ConfigParser()
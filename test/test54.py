@@ -0,0 +1,23 @@
+import time
+from luna.freelist import FreeList
+
+def bench(descr, func, *args):
+    start = time.time()
+    res = func(*args)
+    print "%-40s %10.4f s" % (descr, time.time() - start)
+    return res
+
+for prefix in [24, 16, 8]:
+    size = (1<<(32-prefix))-2
+    count = min(10000, size / 2)
+    print "==== /%s, %s addresses" % (prefix, size)
+    fl = FreeList([{'start': 1, 'end': size}])
+    bench("take_next x %s" % count, lambda: [fl.take_next() for i in range(count)])
+    bench("release every 2nd x %s" % (count / 2), lambda: [fl.release(i) for i in range(1, count, 2)])
+    print "%-40s %10s" % ("fragments", len(fl))
+    bench("take odd IPs back x %s" % (count / 2), lambda: [fl.take(i) for i in range(1, count, 2)])
+    bench("take range of %s" % (size / 4), fl.take, size / 2, size / 2 + size / 4 - 1)
+    bench("take_first(%s)" % count, fl.take_first, count)
+    bench("release range of %s" % (size / 4), fl.release, size / 2, size / 2 + size / 4 - 1)
+    bench("used_ranges", lambda: list(fl.used_ranges()))
+    bench("to_list", fl.to_list)
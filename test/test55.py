@@ -0,0 +1,58 @@
+import sys
+from luna.freelist import FreeList
+
+failed = []
+
+def check(descr, got, expected):
+    if got == expected:
+        print "%-45s OK" % descr
+    else:
+        print "%-45s FAIL: got %s, expected %s" % (descr, got, expected)
+        failed.append(descr)
+
+def ranges(fl):
+    return [(elem['start'], elem['end']) for elem in fl.to_list()]
+
+fl = FreeList([{'start': 1, 'end': 10}])
+check("take_next", fl.take_next(), 1)
+check("list after take_next", ranges(fl), [(2, 10)])
+check("take(5)", fl.take(5), True)
+check("list after take(5)", ranges(fl), [(2, 4), (6, 10)])
+check("take(5) again", fl.take(5), False)
+check("take(3, 7) over used IP", fl.take(3, 7), False)
+check("list is not changed", ranges(fl), [(2, 4), (6, 10)])
+check("take_first(4)", fl.take_first(4), [2, 3, 4, 6])
+check("list after take_first", ranges(fl), [(7, 10)])
+check("take_block(3)", fl.take_block(3), 7)
+check("list after take_block", ranges(fl), [(10, 10)])
+check("take_block(2) no space", fl.take_block(2), None)
+
+check("release(5)", fl.release(5), True)
+check("list after release(5)", ranges(fl), [(5, 5), (10, 10)])
+check("release(6) merges left", fl.release(6), True)
+check("list after release(6)", ranges(fl), [(5, 6), (10, 10)])
+check("release(7, 9) merges both", fl.release(7, 9), True)
+check("list after release(7, 9)", ranges(fl), [(5, 10)])
+check("double release(6)", fl.release(6), False)
+check("list after double release", ranges(fl), [(5, 10)])
+check("used_ranges", list(fl.used_ranges()), [(1, 4)])
+
+check("set_uplimit(20)", fl.set_uplimit(20), True)
+check("list after set_uplimit", ranges(fl), [(5, 20)])
+check("take(8, 9)", fl.take(8, 9), True)
+check("used_ranges with gap", list(fl.used_ranges()), [(1, 4), (8, 9)])
+check("release(1, 4)", fl.release(1, 4), True)
+check("list after release(1, 4)", ranges(fl), [(1, 7), (10, 20)])
+check("used_ranges after release", list(fl.used_ranges()), [(8, 9)])
+check("first", fl.first, 1)
+check("last", fl.last, 20)
+check("free_count", fl.free_count, 18)
+check("take_first(19) not enough", fl.take_first(19), None)
+check("list after failed take_first", ranges(fl), [(1, 7), (10, 20)])
+check("release(8, 9) joins all", fl.release(8, 9), True)
+check("single range left", ranges(fl), [(1, 20)])
+check("set_uplimit below start", fl.set_uplimit(0), False)
+
+if failed:
+    print "%s checks failed" % len(failed)
+    sys.exit(1)
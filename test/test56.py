@@ -0,0 +1,64 @@
+'''
+Link counting in 'links' collection. Needs running MongoDB,
+objects are created in 'luna_test' database
+'''
+import threading
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+osimage = add_osimage(mongo_db)
+net = add_network(mongo_db, 'net1', '10.1.0.0', 16)
+
+def link_count(src, dst):
+    doc = mongo_db['links'].find_one({'src': src.DBRef, 'dst': dst.DBRef})
+    if not doc:
+        return 0
+    return doc['count']
+
+check("no link", link_count(net, osimage), 0)
+net.link(osimage)
+check("link", link_count(net, osimage), 1)
+net.link(osimage)
+check("second link increments counter", link_count(net, osimage), 2)
+check("get_links", [l['name'] for l in net.get_links(resolve = True, collection = 'osimage')], ['testimage'])
+check("get_back_links", [l['name'] for l in osimage.get_back_links(resolve = True, collection = 'network')], ['net1'])
+check("unlink decrements counter", net.unlink(osimage), True)
+check("counter", link_count(net, osimage), 1)
+check("last unlink", net.unlink(osimage), True)
+check("link document removed", mongo_db['links'].find({'src': net.DBRef, 'dst': osimage.DBRef}).count(), 0)
+check("unlink without link", net.unlink(osimage), None)
+check("link to itself", net.link(net), None)
+
+threads_num = 10
+links_num = 20
+
+def worker():
+    obj = luna.Network('net1', mongo_db = mongo_db)
+    for i in range(links_num):
+        obj.link(osimage)
+    for i in range(links_num / 2):
+        obj.unlink(osimage)
+
+threads = [threading.Thread(target = worker) for i in range(threads_num)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+check("concurrent link/unlink", link_count(net, osimage), threads_num * links_num / 2)
+check("single link document", mongo_db['links'].find({'src': net.DBRef, 'dst': osimage.DBRef}).count(), 1)
+
+def unlinker():
+    obj = luna.Network('net1', mongo_db = mongo_db)
+    for i in range(links_num / 2):
+        obj.unlink(osimage)
+
+threads = [threading.Thread(target = unlinker) for i in range(threads_num)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+check("concurrent unlink to zero", mongo_db['links'].find({'src': net.DBRef, 'dst': osimage.DBRef}).count(), 0)
+
+finish()
@@ -0,0 +1,45 @@
+'''
+Conversion of '_use_'/'_usedby_' maps to 'links' collection.
+Needs running MongoDB, objects are created in 'luna_test' database
+'''
+from bson.objectid import ObjectId
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+group = add_group(mongo_db, networks = {'eth0': 'net1'})
+luna.Node('node001', mongo_db = mongo_db, create = True, group = 'compute')
+luna.Node('node002', mongo_db = mongo_db, create = True, group = 'compute')
+
+def links_dump():
+    ret = []
+    for doc in mongo_db['links'].find():
+        ret.append((doc['src'].collection, str(doc['src'].id), doc['dst'].collection, str(doc['dst'].id), doc['count']))
+    return sorted(ret)
+
+expected = links_dump()
+check("links are created", len(expected) > 0, True)
+check("nothing to convert", luna.utils.migrate_links(mongo_db), False)
+
+# turn database to the old format
+for (src_coll, src_id, dst_coll, dst_id, count) in expected:
+    mongo_db[src_coll].update({'_id': ObjectId(src_id)},
+            {'$set': {'_use_.' + dst_coll + '.' + dst_id: count}})
+    mongo_db[dst_coll].update({'_id': ObjectId(dst_id)},
+            {'$set': {'_usedby_.' + src_coll + '.' + src_id: count}})
+mongo_db['links'].remove()
+check("links are dropped", links_dump(), [])
+
+check("convert", luna.utils.migrate_links(mongo_db), True)
+check("links are restored", links_dump(), expected)
+check("no '_use_' left", sum([mongo_db[c].find({'_use_': {'$exists': True}}).count() for c in ['cluster', 'network', 'osimage', 'group', 'node']]), 0)
+check("no '_usedby_' left", sum([mongo_db[c].find({'_usedby_': {'$exists': True}}).count() for c in ['cluster', 'network', 'osimage', 'group', 'node']]), 0)
+check("second run does nothing", luna.utils.migrate_links(mongo_db), False)
+check("links are unchanged", links_dump(), expected)
+
+node = luna.Node('node001', mongo_db = mongo_db)
+check("back links of group", sorted([l['name'] for l in group.get_back_links(resolve = True, collection = 'node')]), ['node001', 'node002'])
+check("delete node", node.delete(), True)
+check("back links after delete", [l['name'] for l in group.get_back_links(resolve = True, collection = 'node')], ['node002'])
+
+finish()
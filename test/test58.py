@@ -0,0 +1,42 @@
+'''
+Node.bulk_create and rollback of reserved IPs.
+Needs running MongoDB, objects are created in 'luna_test' database
+'''
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+net1 = add_network(mongo_db, 'net1', '10.1.0.0', 16)
+# 5 IPs available, the last one is taken by ns_ip
+ipmi = add_network(mongo_db, 'ipmi', '10.2.0.0', 29)
+group = add_group(mongo_db, networks = {'eth0': 'net1'}, bmcnetwork = 'ipmi')
+
+def freelist(net):
+    return mongo_db['network'].find_one({'_id': net._id})['freelist']
+
+names = ['node001', 'node002', 'node003']
+check("bulk_create", luna.Node.bulk_create(names, 'compute', mongo_db = mongo_db), names)
+check("nodes exist", luna.list('node', mongo_db = mongo_db), names)
+check("IPs of the nodes", [node_ip(mongo_db, name) for name in names], ['10.1.0.1', '10.1.0.2', '10.1.0.3'])
+check("BMC IPs of the nodes", [luna.Node(name, mongo_db = mongo_db).get_human_bmc_ip() for name in names],
+        ['10.2.0.1', '10.2.0.2', '10.2.0.3'])
+check("links to group", mongo_db['links'].find({'src.$ref': 'node', 'dst': group.DBRef}).count(), 3)
+check("links to cluster", mongo_db['links'].find({'src.$ref': 'node', 'dst': cluster.DBRef}).count(), 3)
+check("node counter", luna.Cluster(mongo_db = mongo_db).next_node_num('node'), 4)
+
+check("duplicate names", luna.Node.bulk_create(['node010', 'node010'], 'compute', mongo_db = mongo_db), None)
+check("existing names", luna.Node.bulk_create(['node003', 'node011'], 'compute', mongo_db = mongo_db), None)
+check("nothing created", luna.list('node', mongo_db = mongo_db), names)
+
+net1_before = freelist(net1)
+ipmi_before = freelist(ipmi)
+names = ['node%03d' % i for i in range(20, 30)]
+check("not enough BMC IPs", luna.Node.bulk_create(names, 'compute', mongo_db = mongo_db), None)
+check("nothing created", len(luna.list('node', mongo_db = mongo_db)), 3)
+check("IPs of net1 are released", freelist(net1), net1_before)
+check("IPs of ipmi are not changed", freelist(ipmi), ipmi_before)
+
+names = ['node004', 'node005']
+check("bulk_create of the rest", luna.Node.bulk_create(names, 'compute', mongo_db = mongo_db), names)
+check("ipmi is full", luna.Network('ipmi', mongo_db = mongo_db)._get_free_list().free_count, 0)
+
+finish()
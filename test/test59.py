@@ -0,0 +1,56 @@
+'''
+Node name counter: Cluster.next_node_num and Cluster.update_node_num.
+Needs running MongoDB, objects are created in 'luna_test' database
+'''
+import threading
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_group(mongo_db, networks = {'eth0': 'net1'})
+
+luna.Node('node007', mongo_db = mongo_db, create = True, group = 'compute')
+check("counter is not seeded yet", luna.Cluster(mongo_db = mongo_db).get('nodecounters'), None)
+check("counter is seeded from nodes", cluster.next_node_num('node'), 8)
+check("next number", cluster.next_node_num('node'), 9)
+node = luna.Node(mongo_db = mongo_db, create = True, group = 'compute')
+check("generated name", node.name, 'node010')
+
+luna.Node('node020', mongo_db = mongo_db, create = True, group = 'compute')
+check("explicit name moves counter forward", cluster.next_node_num('node'), 21)
+luna.Node('node005', mongo_db = mongo_db, create = True, group = 'compute')
+check("but not backward", cluster.next_node_num('node'), 22)
+check("update_node_num", cluster.update_node_num(['node030', 'node025', 'foo100', 'nodeX']), True)
+check("counter after update_node_num", cluster.next_node_num('node'), 31)
+
+threads_num = 10
+nums_num = 10
+nums = []
+
+def worker():
+    obj = luna.Cluster(mongo_db = mongo_db)
+    ret = []
+    for i in range(nums_num):
+        ret.append(obj.next_node_num('node'))
+    nums.extend(ret)
+
+threads = [threading.Thread(target = worker) for i in range(threads_num)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+check("concurrent numbers are unique", sorted(nums), range(32, 32 + threads_num * nums_num))
+
+# name could be taken without moving counter
+last = 32 + threads_num * nums_num
+mongo_db['node'].insert({'name': 'node%03d' % last})
+node = luna.Node(mongo_db = mongo_db, create = True, group = 'compute')
+check("taken name is skipped", node.name, 'node%03d' % (last + 1))
+mongo_db['node'].remove({'name': 'node%03d' % last})
+
+check("other prefix has own counter", cluster.next_node_num('compute'), 1)
+check("other prefix next number", cluster.next_node_num('compute'), 2)
+check("counter of default prefix", cluster.next_node_num('node'), last + 2)
+
+finish()
@@ -0,0 +1,115 @@
+'''
+Network.renumber and Group.renumber, including resume of interrupted
+move and rollback. Needs running MongoDB, objects are created
+in 'luna_test' database
+'''
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+net1 = add_network(mongo_db, 'net1', '10.1.0.0', 16)
+net2 = add_network(mongo_db, 'net2', '10.2.0.0', 16)
+ipmi = add_network(mongo_db, 'ipmi', '10.10.0.0', 16)
+# only one IP available, the last one is taken by ns_ip
+add_network(mongo_db, 'net3', '10.3.0.0', 30)
+group = add_group(mongo_db, networks = {'eth0': 'net1'})
+for name in ['node001', 'node002', 'node003']:
+    luna.Node(name, mongo_db = mongo_db, create = True, group = 'compute')
+full = luna.Network('net2', mongo_db = mongo_db)._get_free_list().free_count
+
+def free_count(name):
+    return luna.Network(name, mongo_db = mongo_db)._get_free_list().free_count
+
+def net_doc(name):
+    return mongo_db['network'].find_one({'name': name})
+
+def ips(interface = 'eth0'):
+    return [node_ip(mongo_db, name, interface) for name in luna.list('node', mongo_db = mongo_db)]
+
+def group_links(name):
+    net = luna.Network(name, mongo_db = mongo_db)
+    doc = mongo_db['links'].find_one({'src': group.DBRef, 'dst': net.DBRef})
+    if not doc:
+        return 0
+    return doc['count']
+
+def short(diff):
+    return [(elem['name'], elem['bmc'], elem['old'], elem['new']) for elem in diff]
+
+luna.Node('node002', mongo_db = mongo_db).delete()
+check("IPs before renumber", ips(), ['10.1.0.1', '10.1.0.3'])
+
+diff = net1.renumber(dry_run = True)
+check("network renumber dry run", short(diff),
+        [('node001', False, '10.1.0.1', '10.1.0.1'), ('node003', False, '10.1.0.3', '10.1.0.2')])
+check("IPs are not changed", ips(), ['10.1.0.1', '10.1.0.3'])
+diff = net1.renumber()
+check("network renumber", short(diff),
+        [('node001', False, '10.1.0.1', '10.1.0.1'), ('node003', False, '10.1.0.3', '10.1.0.2')])
+check("IPs after renumber", ips(), ['10.1.0.1', '10.1.0.2'])
+check("free IPs of net1", free_count('net1'), full - 2)
+
+check("interface and bmc together", group.renumber(interface = 'eth0', network = 'net2', bmc = True), None)
+check("neither interface nor bmc", group.renumber(network = 'net2'), None)
+check("wrong interface", group.renumber(interface = 'eth1', network = 'net2'), None)
+
+diff = group.renumber(interface = 'eth0', network = 'net2', dry_run = True)
+check("group move dry run", short(diff),
+        [('node001', False, '10.1.0.1', '10.2.0.1'), ('node003', False, '10.1.0.2', '10.2.0.2')])
+check("IPs are not changed", ips(), ['10.1.0.1', '10.1.0.2'])
+check("free IPs of net2 are not changed", free_count('net2'), full)
+
+diff = group.renumber(interface = 'eth0', network = 'net2')
+check("group move", short(diff),
+        [('node001', False, '10.1.0.1', '10.2.0.1'), ('node003', False, '10.1.0.2', '10.2.0.2')])
+check("IPs after move", ips(), ['10.2.0.1', '10.2.0.2'])
+check("IPs of net1 are released", free_count('net1'), full)
+check("IPs of net2 are reserved", free_count('net2'), full - 2)
+check("group is unlinked from net1", group_links('net1'), 0)
+check("group is linked to net2", group_links('net2'), 1)
+check("move marker is removed", 'renumber' in mongo_db['group'].find_one({'_id': group.id}), False)
+check("tagged changes are forgotten", bool(net_doc('net2').get('freelist_changes')), False)
+
+diff = group.renumber(bmc = True, network = 'ipmi')
+check("BMC move", short(diff), [('node001', True, None, '10.10.0.1'), ('node003', True, None, '10.10.0.2')])
+check("BMC IPs", [luna.Node(name, mongo_db = mongo_db).get_human_bmc_ip() for name in ['node001', 'node003']],
+        ['10.10.0.1', '10.10.0.2'])
+check("group is linked to ipmi", group_links('ipmi'), 1)
+
+# interrupted move of eth0 from net2 back to net1: marker is set,
+# IPs are reserved in net1 and released in net2, nodes are not touched
+node_ids = [luna.Node(name, mongo_db = mongo_db).id for name in ['node001', 'node003']]
+pending = {'id': 'test', 'interface': 'eth0', 'network': net2.DBRef, 'release': [1, 2], 'nodes': node_ids}
+mongo_db['group'].update({'_id': group.id},
+        {'$set': {'interfaces.eth0.network': net1.DBRef, 'renumber': pending}})
+net1.reserve_block(2, contiguous = False, tag = 'test-reserve')
+net2.release_ips([1, 2], tag = 'test-release')
+net1_version = net_doc('net1')['freelist_version']
+net2_version = net_doc('net2')['freelist_version']
+
+group = luna.Group('compute', mongo_db = mongo_db)
+check("other interface while move is pending", group.renumber(bmc = True, network = 'net2'), None)
+check("dry run while move is pending", group.renumber(interface = 'eth0', dry_run = True), None)
+check("other network while move is pending", group.renumber(interface = 'eth0', network = 'net3'), None)
+
+diff = group.renumber(interface = 'eth0')
+check("resume", short(diff), [('node001', False, None, '10.1.0.1'), ('node003', False, None, '10.1.0.2')])
+check("IPs after resume", ips(), ['10.1.0.1', '10.1.0.2'])
+check("IPs of net1 are reserved once", free_count('net1'), full - 2)
+check("IPs of net2 are released once", free_count('net2'), full)
+check("net1 free list is not written", net_doc('net1')['freelist_version'], net1_version)
+check("net2 free list is not written", net_doc('net2')['freelist_version'], net2_version)
+check("group is unlinked from net2", group_links('net2'), 0)
+check("group is linked to net1", group_links('net1'), 1)
+check("move marker is removed", 'renumber' in mongo_db['group'].find_one({'_id': group.id}), False)
+check("tagged changes of net1 are forgotten", bool(net_doc('net1').get('freelist_changes')), False)
+check("tagged changes of net2 are forgotten", bool(net_doc('net2').get('freelist_changes')), False)
+
+check("move to too small network", group.renumber(interface = 'eth0', network = 'net3'), None)
+check("network of interface is restored",
+        mongo_db['group'].find_one({'_id': group.id})['interfaces']['eth0']['network'], net1.DBRef)
+check("move marker is removed", 'renumber' in mongo_db['group'].find_one({'_id': group.id}), False)
+check("IPs are not changed", ips(), ['10.1.0.1', '10.1.0.2'])
+check("IPs of net3 are not changed", free_count('net3'), 1)
+check("group is still linked to net1", group_links('net1'), 1)
+
+finish()
@@ -0,0 +1,65 @@
+'''
+Incremental zone regeneration by Cluster.makedns: zone files are
+rewritten and serials are bumped only if content was changed.
+Needs running MongoDB and 'named' user, objects are created
+in 'luna_test' database
+'''
+import os
+import re
+import datetime
+import tempfile
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+zonedir = tempfile.mkdtemp(prefix = 'luna_test_named.')
+cluster.set('named_include_file', zonedir + '/named.luna.zones')
+cluster.set('named_zone_dir', zonedir)
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_group(mongo_db, networks = {'eth0': 'net1'})
+luna.Node('node001', mongo_db = mongo_db, create = True, group = 'compute')
+luna.Node('node002', mongo_db = mongo_db, create = True, group = 'compute')
+
+min_serial = int(datetime.date.today().strftime('%Y%m%d00'))
+zones = ['0.1.10.in-addr.arpa', '255.1.10.in-addr.arpa', 'net1']
+
+def serial(zone):
+    with open(zonedir + '/' + zone + '.luna.zone') as f:
+        return luna.cluster._get_zone_serial(f.read())
+
+def mtime(zone):
+    return os.stat(zonedir + '/' + zone + '.luna.zone').st_mtime
+
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+check("first run creates all zones", sorted(res['zones']), zones)
+check("include file is created", res['include_changed'], True)
+check("serials start from today", [serial(zone) for zone in zones], [min_serial] * 3)
+with open(zonedir + '/net1.luna.zone') as f:
+    content = f.read()
+check("node is in zone", bool(re.search(r'^node002\s+IN A 10.1.0.2$', content, re.M)), True)
+
+mtimes = [mtime(zone) for zone in zones]
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+check("rerun changes nothing", res, {'zones': [], 'include_changed': False})
+check("files are not rewritten", [mtime(zone) for zone in zones], mtimes)
+check("serials are not changed", [serial(zone) for zone in zones], [min_serial] * 3)
+
+luna.Node('node003', mongo_db = mongo_db, create = True, group = 'compute')
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+check("new node changes zones", sorted(res['zones']), ['0.1.10.in-addr.arpa', 'net1'])
+check("include file is not changed", res['include_changed'], False)
+check("serials are bumped", [serial(zone) for zone in zones], [min_serial + 1, min_serial, min_serial + 1])
+
+luna.Node('node003', mongo_db = mongo_db).delete()
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+check("deleted node changes zones", sorted(res['zones']), ['0.1.10.in-addr.arpa', 'net1'])
+check("serials are bumped again", [serial(zone) for zone in zones], [min_serial + 2, min_serial, min_serial + 2])
+
+add_network(mongo_db, 'net2', '10.2.0.0', 24)
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+check("new network adds zones", sorted(res['zones']), ['0.2.10.in-addr.arpa', 'net2'])
+check("include file is changed", res['include_changed'], True)
+with open(zonedir + '/named.luna.zones') as f:
+    content = f.read()
+check("include file has new zone", 'zone "net2" IN {' in content, True)
+
+finish()
@@ -0,0 +1,58 @@
+'''
+Reverse zones are split according to named_rev_zone_prefix.
+Needs running MongoDB and 'named' user, objects are created
+in 'luna_test' database
+'''
+import os
+import re
+import tempfile
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+zonedir = tempfile.mkdtemp(prefix = 'luna_test_named.')
+cluster.set('named_include_file', zonedir + '/named.luna.zones')
+cluster.set('named_zone_dir', zonedir)
+add_network(mongo_db, 'net2', '10.2.0.0', 16)
+add_network(mongo_db, 'net3', '10.3.0.0', 24)
+add_group(mongo_db, networks = {'eth0': 'net2'})
+names = ['node%03d' % i for i in range(1, 301)]
+check("create 300 nodes", luna.Node.bulk_create(names, 'compute', mongo_db = mongo_db), names)
+
+def zone_files():
+    return sorted([f[:-len('.luna.zone')] for f in os.listdir(zonedir) if f.endswith('.luna.zone')])
+
+def zone_content(zone):
+    with open(zonedir + '/' + zone + '.luna.zone') as f:
+        return f.read()
+
+def include_zones():
+    with open(zonedir + '/named.luna.zones') as f:
+        return sorted(re.findall(r'^zone "(\S+)" IN', f.read(), re.M))
+
+check("default prefix", cluster.get('named_rev_zone_prefix'), 24)
+luna.Cluster(mongo_db = mongo_db).makedns()
+zones = ['0.2.10.in-addr.arpa', '0.3.10.in-addr.arpa', '1.2.10.in-addr.arpa', '255.2.10.in-addr.arpa', 'net2', 'net3']
+check("zones for prefix 24", zone_files(), zones)
+check("zones in include file", include_zones(), zones)
+check("PTR in first zone", bool(re.search(r'^1\s+IN PTR node001.net2.$', zone_content('0.2.10.in-addr.arpa'), re.M)), True)
+check("PTR in second zone", bool(re.search(r'^44\s+IN PTR node300.net2.$', zone_content('1.2.10.in-addr.arpa'), re.M)), True)
+check("only ns_ip in its zone", len(re.findall(r'IN PTR', zone_content('255.2.10.in-addr.arpa'))), 1)
+
+check("wrong prefix", cluster.set('named_rev_zone_prefix', 20), None)
+cluster.set('named_rev_zone_prefix', 16)
+res = luna.Cluster(mongo_db = mongo_db).makedns()
+# network longer than prefix keeps its own zone
+zones = ['0.3.10.in-addr.arpa', '2.10.in-addr.arpa', 'net2', 'net3']
+check("zones for prefix 16", zone_files(), zones)
+check("zones in include file", include_zones(), zones)
+check("changed zones", res['zones'], ['2.10.in-addr.arpa'])
+content = zone_content('2.10.in-addr.arpa')
+check("PTR with two octets", bool(re.search(r'^44.1\s+IN PTR node300.net2.$', content, re.M)), True)
+check("all nodes in one zone", len(re.findall(r'IN PTR node\d+\.net2\.', content)), 300)
+
+cluster.set('named_rev_zone_prefix', 24)
+luna.Cluster(mongo_db = mongo_db).makedns()
+zones = ['0.2.10.in-addr.arpa', '0.3.10.in-addr.arpa', '1.2.10.in-addr.arpa', '255.2.10.in-addr.arpa', 'net2', 'net3']
+check("zones are split back", zone_files(), zones)
+
+finish()
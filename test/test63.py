@@ -0,0 +1,70 @@
+'''
+Static host entries for dhcpd: full and incremental regeneration
+and DhcpHostsUpdater. Needs running MongoDB, objects are created
+in 'luna_test' database
+'''
+import os
+import time
+from testlib import *
+
+mongo_db, cluster = init_cluster()
+net1 = add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_network(mongo_db, 'net2', '10.2.0.0', 16)
+add_group(mongo_db, 'compute', networks = {'eth0': 'net1'})
+add_group(mongo_db, 'other', networks = {'eth0': 'net2'})
+for name in ['node001', 'node002', 'node003']:
+    luna.Node(name, mongo_db = mongo_db, create = True, group = 'compute')
+luna.Node('node004', mongo_db = mongo_db, create = True, group = 'other')
+# makedhcp writes to /etc/dhcp, so DHCP network is set directly
+mongo_db['cluster'].update({'_id': cluster.id}, {'$set': {'dhcp_net': str(net1.id)}})
+hostsfile = luna.Cluster(mongo_db = mongo_db).get_dhcp_hosts_file()
+
+def node(name):
+    return luna.Node(name, mongo_db = mongo_db)
+
+def read_hosts():
+    with open(hostsfile) as f:
+        return f.read()
+
+def hosts():
+    entries = luna.cluster._parse_dhcp_hosts(read_hosts())
+    ret = {}
+    for name in entries:
+        mac, ip, statements = luna.cluster._split_dhcp_host(entries[name])
+        ret[name] = (mac, ip)
+    return ret
+
+check("set_mac before makedhcp", node('node001').set_mac('00:00:00:00:00:01'), True)
+check("file is not created", os.path.exists(hostsfile), False)
+
+check("full update", luna.Cluster(mongo_db = mongo_db).update_dhcp_hosts(), True)
+check("entries", hosts(), {'node001': ('00:00:00:00:00:01', '10.1.0.1')})
+
+node('node002').set_mac('00:00:00:00:00:02')
+node('node004').set_mac('00:00:00:00:00:04')
+check("entries after set_mac", hosts(), {'node001': ('00:00:00:00:00:01', '10.1.0.1'),
+        'node002': ('00:00:00:00:00:02', '10.1.0.2'), 'node004': ('00:00:00:00:00:04', None)})
+
+node('node003').set_mac('00:00:00:00:00:01')
+check("MAC is moved to other node", hosts(), {'node003': ('00:00:00:00:00:01', '10.1.0.3'),
+        'node002': ('00:00:00:00:00:02', '10.1.0.2'), 'node004': ('00:00:00:00:00:04', None)})
+
+node('node002').set_mac('00:00:00:00:00:22')
+check("MAC of node is changed", hosts()['node002'], ('00:00:00:00:00:22', '10.1.0.2'))
+
+node('node003').clear_mac()
+check("entry is removed on clear_mac", sorted(hosts().keys()), ['node002', 'node004'])
+
+content = read_hosts()
+luna.Cluster(mongo_db = mongo_db).update_dhcp_hosts()
+check("full update gives the same content", read_hosts(), content)
+
+updater = luna.DhcpHostsUpdater(mongo_db, interval = 1)
+time.sleep(1.5)
+node('node001').set_mac('00:00:00:00:00:11', update_dhcp = False)
+check("file is not updated at once", 'node001' in hosts(), False)
+time.sleep(2.5)
+check("updater adds entry", hosts().get('node001'), ('00:00:00:00:00:11', '10.1.0.1'))
+updater.stop()
+
+finish()
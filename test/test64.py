@@ -0,0 +1,65 @@
+'''
+MacIndex: MAC to node resolution with incremental polling.
+Needs running MongoDB, objects are created in 'luna_test' database
+'''
+import datetime
+from testlib import *
+from luna.manager import MacIndex
+
+mongo_db, cluster = init_cluster()
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_group(mongo_db, networks = {'eth0': 'net1'})
+for name in ['node001', 'node002', 'node003']:
+    luna.Node(name, mongo_db = mongo_db, create = True, group = 'compute')
+switch = luna.Switch('switch01', mongo_db = mongo_db, create = True, network = 'net1', ip = '10.1.0.250')
+
+def node(name):
+    return luna.Node(name, mongo_db = mongo_db)
+
+mac1, mac2, mac3, mac4 = ['00:00:00:00:00:0%s' % i for i in range(1, 5)]
+index = MacIndex(mongo_db, poll_interval = 0)
+
+check("unknown MAC", index.resolve([mac1]), (None, None, False))
+node('node001').set_mac(mac1)
+check("bound MAC", index.resolve([mac1]), (node('node001').id, mac1, False))
+check("MAC in upper case", index.resolve([mac1.upper()]), (node('node001').id, mac1, False))
+check("first known MAC of the list", index.resolve([mac2, mac1]), (node('node001').id, mac1, False))
+last_reload = index._last_reload
+
+node('node002').set_mac(mac1)
+check("MAC is moved to other node", index.resolve([mac1]), (node('node002').id, mac1, False))
+node('node002').set_mac(mac2)
+check("old MAC of node is dropped", index.resolve([mac1]), (None, None, False))
+check("new MAC of node", index.resolve([mac2]), (node('node002').id, mac2, False))
+node('node002').clear_mac()
+check("cleared MAC", index.resolve([mac2]), (None, None, False))
+check("changes are polled incrementally", index._last_reload, last_reload)
+
+node('node003').set_switch('switch01')
+node('node003').set_port('5')
+now = datetime.datetime.utcnow()
+mongo_db['switch_mac'].insert({'mac': mac3, 'switch_id': switch.id, 'port': '5', 'portname': '5', 'updated': now})
+check("MAC learned on switch port", index.resolve([mac3]), (node('node003').id, mac3, True))
+node('node003').set_mac(mac4)
+check("bound MAC has priority", index.resolve([mac3, mac4]), (node('node003').id, mac4, False))
+node('node003').clear_mac()
+
+mongo_db['switch_mac'].insert({'mac': mac4, 'switch_id': switch.id, 'port': '5', 'portname': '5',
+        'updated': now - datetime.timedelta(seconds = 120)})
+index = MacIndex(mongo_db, poll_interval = 0, aging = 60)
+check("learned MAC after full load", index.resolve([mac3]), (node('node003').id, mac3, True))
+check("stale learned MAC is ignored", index.resolve([mac4]), (None, None, False))
+
+node('node003').clear_port()
+check("learned MAC after port is cleared", index.resolve([mac3]), (None, None, False))
+
+mongo_db['mac'].insert({'mac': '00:00:00:00:01:01', 'node': None, 'updated': now - datetime.timedelta(hours = 1)})
+mongo_db['mac'].insert({'mac': '00:00:00:00:01:02', 'node': None, 'updated': now})
+node('node001').set_mac('00:00:00:00:01:03')
+index = MacIndex(mongo_db, poll_interval = 0, reload_interval = 0)
+index.resolve([mac1])
+check("old unbound MAC is purged", mongo_db['mac'].find({'mac': '00:00:00:00:01:01'}).count(), 0)
+check("recent unbound MAC is kept", mongo_db['mac'].find({'mac': '00:00:00:00:01:02'}).count(), 1)
+check("bound MAC is kept", mongo_db['mac'].find({'node': {'$ne': None}}).count(), 1)
+
+finish()
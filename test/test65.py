@@ -0,0 +1,62 @@
+'''
+Cached iPXE boot menu: Etag/Last-Modified, 304 responses, invalidation
+and paging. Needs running MongoDB, objects are created in 'luna_test'
+database
+'''
+import time
+from testlib import *
+import luna.manager
+
+mongo_db, cluster = init_cluster()
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_group(mongo_db, networks = {'eth0': 'net1'})
+for name in ['node001', 'node002', 'node003']:
+    luna.Node(name, mongo_db = mongo_db, create = True, group = 'compute')
+request = start_lweb(mongo_db, cluster)
+
+code, headers, menu = request('step=boot')
+check("boot menu", code, 200)
+check("nodes in menu", [name for name in ['node001', 'node002', 'node003'] if 'item %s %s' % (name, name) in menu],
+        ['node001', 'node002', 'node003'])
+etag = headers.get('Etag')
+last_modified = headers.get('Last-Modified')
+check("Etag is set", bool(etag), True)
+check("Last-Modified is set", bool(last_modified), True)
+check("menu is cached", (None, 1) in luna.manager._boot_menu_cache['pages'], True)
+
+code, headers, content = request('step=boot')
+check("cached menu", (code, headers.get('Etag'), content), (200, etag, menu))
+check("If-None-Match", request('step=boot', {'If-None-Match': etag})[0], 304)
+check("If-None-Match of other version", request('step=boot', {'If-None-Match': '"other"'})[0], 200)
+check("If-Modified-Since", request('step=boot', {'If-Modified-Since': last_modified})[0], 304)
+check("If-Modified-Since in the past", request('step=boot', {'If-Modified-Since': 'Thu, 01 Jan 2015 00:00:00 GMT'})[0], 200)
+check("unknown group", request('step=boot&group=foo')[0], 404)
+
+luna.Node('node004', mongo_db = mongo_db, create = True, group = 'compute')
+# generations are polled once a second
+time.sleep(1.1)
+code, headers, content = request('step=boot', {'If-None-Match': etag})
+check("new node changes menu", code, 200)
+check("new Etag", headers.get('Etag') != etag, True)
+check("new node in menu", 'item node004 node004' in content, True)
+
+luna.manager.boot_menu_page_size = 2
+luna.Node('node005', mongo_db = mongo_db, create = True, group = 'compute')
+time.sleep(1.1)
+code, headers, content = request('step=boot')
+check("menu of groups", 'item compute compute' in content, True)
+check("no nodes in menu of groups", 'item node001 node001' in content, False)
+code, headers, content = request('step=boot&group=compute')
+check("first page", [name for name in ['node001', 'node002', 'node003'] if 'item %s %s' % (name, name) in content],
+        ['node001', 'node002'])
+check("next page link", 'item nextpage' in content, True)
+code, headers, content = request('step=boot&group=compute&page=3')
+check("last page", ('item node005 node005' in content, 'item nextpage' in content), (True, False))
+code, headers, page = request('step=boot&group=compute&page=100')
+check("page number is clamped", page, content)
+code, headers, page = request('step=boot&group=compute&page=abc')
+check("wrong page number", 'item node001 node001' in page, True)
+check("pages in cache", sorted(luna.manager._boot_menu_cache['pages'].keys()),
+        [(None, 1), ('compute', 1), ('compute', 3)])
+
+finish()
@@ -0,0 +1,61 @@
+'''
+Cache of rendered nodeboot and install scripts: scripts are re-rendered
+only if objects they depend on were changed. Needs running MongoDB,
+objects are created in 'luna_test' database
+'''
+import time
+from testlib import *
+import luna.manager
+
+mongo_db, cluster = init_cluster()
+add_network(mongo_db, 'net1', '10.1.0.0', 16)
+add_group(mongo_db, networks = {'eth0': 'net1'})
+for name in ['node001', 'node002']:
+    luna.Node(name, mongo_db = mongo_db, create = True, group = 'compute')
+request = start_lweb(mongo_db, cluster)
+key = ('boot', 'node001')
+
+code, headers, script = request('step=boot&node=node001')
+check("boot script", code, 200)
+check("node name in script", 'luna.node=node001 ' in script, True)
+check("IP in script", 'luna.ip=eth0:10.1.0.1/16 ' in script, True)
+entry = luna.manager._scripts_cache[key]
+check("script is cached", entry['content'], script)
+
+# generations are polled once a second
+add_network(mongo_db, 'net9', '10.9.0.0', 16)
+luna.Node('node003', mongo_db = mongo_db, create = True, group = 'compute')
+time.sleep(1.1)
+code, headers, content = request('step=boot&node=node001')
+check("script after unrelated changes", content, script)
+check("cache entry is kept", luna.manager._scripts_cache[key] is entry, True)
+
+luna.OsImage('testimage', mongo_db = mongo_db).set('kernopts', 'console=ttyS0')
+time.sleep(1.1)
+code, headers, content = request('step=boot&node=node001')
+check("osimage change updates script", 'console=ttyS0' in content, True)
+check("cache entry is replaced", luna.manager._scripts_cache[key] is entry, False)
+
+luna.Node('node001', mongo_db = mongo_db).set('service', True)
+time.sleep(1.1)
+code, headers, content = request('step=boot&node=node001')
+check("node change updates script", 'luna.service=1' in content, True)
+
+code, headers, content = request('step=boot&node=node002')
+check("script of other node", 'luna.ip=eth0:10.1.0.2/16 ' in content, True)
+luna.Node('node001', mongo_db = mongo_db).delete()
+luna.Network('net1', mongo_db = mongo_db).renumber()
+time.sleep(1.1)
+code, headers, content = request('step=boot&node=node002')
+check("network change updates script", 'luna.ip=eth0:10.1.0.1/16 ' in content, True)
+code, headers, content = request('step=boot&node=node001')
+check("deleted node gets boot menu", (code, 'item node002 node002' in content), (200, True))
+check("script of deleted node is dropped", key in luna.manager._scripts_cache, False)
+
+code, headers, content = request('step=install&node=node002')
+check("install script", code, 200)
+check("tarball in install script", 'testimage.tgz' in content, True)
+check("install script is cached", luna.manager._scripts_cache[('install', 'node002')]['content'], content)
+check("install script of unknown node", request('step=install&node=foo')[0], 400)
+
+finish()
@@ -0,0 +1,107 @@
+'''
+Helpers for test scripts running against MongoDB.
+Objects are created in the scratch database 'luna_test',
+which is dropped on every init_cluster() call.
+'''
+import os
+import sys
+import pwd
+import shutil
+import tempfile
+import luna
+import luna.utils
+
+luna.utils.db_name = 'luna_test'
+
+templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'templates')
+
+failed = []
+
+def check(descr, got, expected):
+    if got == expected:
+        print "%-50s OK" % descr
+    else:
+        print "%-50s FAIL: got %s, expected %s" % (descr, got, expected)
+        failed.append(descr)
+
+def finish():
+    if failed:
+        print "%s checks failed" % len(failed)
+        sys.exit(1)
+    print "All checks passed"
+
+def init_cluster():
+    """
+    Creates empty cluster in the scratch database. Cluster path
+    is a temporary dir with a copy of templates
+    """
+    luna.utils.get_mongo_client().drop_database(luna.utils.db_name)
+    mongo_db = luna.utils.get_mongo_db()
+    path = tempfile.mkdtemp(prefix = 'luna_test.')
+    shutil.copytree(templates_dir, path + '/templates')
+    user = pwd.getpwuid(os.getuid()).pw_name
+    cluster = luna.Cluster(mongo_db = mongo_db, create = True, path = path, user = user)
+    return (mongo_db, cluster)
+
+def add_osimage(mongo_db, name = 'testimage'):
+    """
+    OsImage constructor checks kernel in rpm database of the image,
+    so the document is inserted directly
+    """
+    mongo_db['osimage'].insert({'name': name, 'path': '/' + name, 'kernver': '3.10.0',
+        'kernopts': '', 'dracutmodules': 'luna', 'kernmodules': '',
+        'kernfile': name + '-vmlinuz', 'initrdfile': name + '-initramfs',
+        'torrent': name, 'tarball': name})
+    return luna.OsImage(name, mongo_db = mongo_db)
+
+def add_group(mongo_db, name = 'compute', networks = None, bmcnetwork = None):
+    """
+    Creates group with interfaces {'eth0': 'net1', ...}, eth0 is boot interface
+    """
+    networks = networks or {}
+    if not mongo_db['osimage'].find_one({'name': 'testimage'}):
+        add_osimage(mongo_db)
+    group = luna.Group(name, mongo_db = mongo_db, create = True, osimage = 'testimage',
+            interfaces = sorted(networks.keys()) or ['eth0'], boot_if = 'eth0',
+            bmcsetup = None, bmcnetwork = bmcnetwork)
+    for interface in sorted(networks):
+        group.set_net_to_if(interface, networks[interface])
+    return luna.Group(name, mongo_db = mongo_db)
+
+def add_network(mongo_db, name, network, prefix):
+    return luna.Network(name, mongo_db = mongo_db, create = True, NETWORK = network, PREFIX = prefix)
+
+def node_ip(mongo_db, name, interface = 'eth0'):
+    return luna.Node(name, mongo_db = mongo_db).get_human_ip(interface)
+
+def start_lweb(mongo_db, cluster):
+    """
+    Starts Manager handler on random port in background thread.
+    Returns function to get '/luna?<query>' as (code, headers, body)
+    """
+    import logging
+    import threading
+    import urllib2
+    import tornado.web
+    import tornado.ioloop
+    import tornado.netutil
+    import tornado.httpserver
+    params = {'server_ip': '127.0.0.1', 'server_port': 7051, 'mongo_db': mongo_db,
+              'app_logger': logging.getLogger('lweb'), 'mac_aging': 60}
+    app = tornado.web.Application([(r"/luna.*", luna.Manager, dict(params=params))],
+            template_path = cluster.get('path') + '/templates')
+    sockets = tornado.netutil.bind_sockets(0, address = '127.0.0.1')
+    port = sockets[0].getsockname()[1]
+    tornado.httpserver.HTTPServer(app).add_sockets(sockets)
+    thread = threading.Thread(target = tornado.ioloop.IOLoop.instance().start)
+    thread.daemon = True
+    thread.start()
+
+    def request(query, headers = None):
+        req = urllib2.Request('http://127.0.0.1:%s/luna?%s' % (port, query), headers = headers or {})
+        try:
+            resp = urllib2.urlopen(req)
+            return (resp.getcode(), resp.info(), resp.read())
+        except urllib2.HTTPError as exc:
+            return (exc.code, exc.info(), None)
+    return request